@@ -0,0 +1,267 @@
+# Solver benchmarks.
+#
+# Runs every solver configuration on every benchmark instance and reports the median CPU time,
+# the search nodes and the constraint checks (see csp.SolverStats):
+#
+#     plain    backtracking search with no preprocessing or heuristics
+#     ac3      AC-3 preprocessing, then plain backtracking search
+#     forward  AC-3 preprocessing, then forward checking search with MRV and LCV
+#     mac      AC-3 preprocessing, then MAC search with MRV and LCV
+#     ac3rm    AC-3rm (residual supports) preprocessing, then MAC search with MRV and LCV
+#     cbj      AC-3 preprocessing, then conflict-directed backjumping
+#     nogood   AC-3 preprocessing, then backjumping with nogood learning
+#     restart  AC-3 preprocessing, then seeded Luby restarts of MAC search with MRV
+#
+# The instances are the Sudoku grids, seeded random 3-colorings of growing size and N-queens.
+# Searches stop after --max-nodes nodes, which is reported as status 'budget'.
+#
+# Example:
+#
+#     python benchmark.py --save baseline.json      # record a baseline
+#     python benchmark.py --baseline baseline.json  # compare against it
+#
+# When comparing, results that got slower than the tolerance allows, or that need more nodes or
+# checks than the baseline, are flagged as regressions and the exit status is 1. Timings of a few
+# milliseconds are mostly noise, so fast searches are repeated for at least --min-time seconds
+# per measurement, and slowdowns of less than --min-slowdown seconds are not flagged. Node and
+# check counts depend on the iteration order of sets of variable names, so the script reruns
+# itself with a fixed PYTHONHASHSEED to make them reproducible.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable
+
+from csp import CSP, IterativeSearch, SolverStats
+from sudoku import build_csp, read_grid
+
+# 'ac3' is the preprocessing strategy (see CSP.ac_3()) or None, and 'search' how to search:
+# 'iterative' with IterativeSearch, 'recursive' with CSP.backtracking_search() (which backjumping
+# needs) or 'restart' with CSP.restart_search(). The other keys are options of the search.
+CONFIGS: dict[str, dict] = {
+    'plain': {'ac3': None, 'search': 'iterative', 'inference': None, 'variable_ordering': 'first', 'value_ordering': 'default'},
+    'ac3': {'ac3': 'ac3', 'search': 'iterative', 'inference': None, 'variable_ordering': 'first', 'value_ordering': 'default'},
+    'forward': {'ac3': 'ac3', 'search': 'iterative', 'inference': 'forward', 'variable_ordering': 'mrv', 'value_ordering': 'lcv'},
+    'mac': {'ac3': 'ac3', 'search': 'iterative', 'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'lcv'},
+    'ac3rm': {'ac3': 'ac3rm', 'search': 'iterative', 'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'lcv'},
+    'cbj': {'ac3': 'ac3', 'search': 'recursive', 'backjumping': True},
+    'nogood': {'ac3': 'ac3', 'search': 'recursive', 'backjumping': True, 'nogood_limit': 1000},
+    'restart': {'ac3': 'ac3', 'search': 'restart', 'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'random', 'seed': 0},
+}
+
+
+class BudgetExceeded(Exception):
+    """Raised by BudgetStats when a search reaches its node budget."""
+
+
+class BudgetStats(SolverStats):
+    """SolverStats that stop a search after max_nodes nodes, for searches without a node budget."""
+
+    def __init__(self, max_nodes: int):
+        super().__init__()
+        self.max_nodes = max_nodes
+
+    def node(self, depth: int):
+        if self.nodes >= self.max_nodes:
+            raise BudgetExceeded
+        super().node(depth)
+
+
+def graph_coloring(size: int, colors: int = 3, degree: float = 4.0, seed: int = 0) -> CSP:
+    """Builds the coloring of a random graph with size vertices and the given average degree.
+
+    The same size and seed always give the same graph.
+    """
+    rng = random.Random(seed)
+    variables = [f'V{i}' for i in range(size)]
+    pairs = [(i, j) for i in range(size) for j in range(i + 1, size)]
+    edges = rng.sample(pairs, min(len(pairs), round(size * degree / 2)))
+    return CSP(
+        variables=variables,
+        domains={variable: set(range(colors)) for variable in variables},
+        edges=[(variables[i], variables[j]) for i, j in edges],
+    )
+
+
+def n_queens(n: int) -> CSP:
+    """Builds N-queens with one variable per column, whose value is the row of its queen."""
+    variables = [f'Q{col}' for col in range(n)]
+    csp = CSP(variables=variables, domains={variable: set(range(n)) for variable in variables}, edges=[])
+    for col1 in range(n):
+        for col2 in range(col1 + 1, n):
+            csp.add_constraint(
+                variables[col1],
+                variables[col2],
+                {(row1, row2) for row1 in range(n) for row2 in range(n)
+                 if row1 != row2 and abs(row1 - row2) != col2 - col1},
+            )
+    return csp
+
+
+def instances() -> dict[str, Callable[[], CSP]]:
+    """Returns the benchmark instances by name, as functions building a fresh CSP."""
+    builders: dict[str, Callable[[], CSP]] = {}
+    for level in ('easy', 'medium', 'hard', 'very_hard'):
+        builders[f'sudoku_{level}'] = lambda level=level: build_csp(read_grid(f'sudoku_{level}.txt'))
+    for size in ('16x16', '25x25'):
+        builders[f'sudoku_{size}'] = lambda size=size: build_csp(read_grid(f'sudoku_{size}.txt'))
+    for size in (25, 50, 100, 200):
+        builders[f'coloring_{size}'] = lambda size=size: graph_coloring(size)
+    for n in (8, 12, 16):
+        builders[f'queens_{n}'] = lambda n=n: n_queens(n)
+    return builders
+
+
+def run_once(build: Callable[[], CSP], config: dict, max_nodes: int) -> tuple[float, str, int, int]:
+    """Solves a freshly built instance once.
+
+    Returns
+    -------
+    tuple[float, str, int, int]
+        The CPU time in seconds (building the CSP excluded, and unaffected by other processes
+        competing for the CPU), the status ('solved', 'unsolvable' or 'budget'), the number of
+        nodes and the number of constraint checks
+    """
+    csp = build()
+    stats = csp.stats = BudgetStats(max_nodes)
+    options = {key: value for key, value in config.items() if key not in ('ac3', 'search')}
+    start_time = time.process_time()
+    if config['ac3'] and not csp.ac_3(config['ac3']):
+        status = 'unsolvable'
+    elif config['search'] == 'restart':
+        status = csp.restart_search(max_nodes=max_nodes, **options).status
+    elif config['search'] == 'recursive':
+        try:
+            status = 'solved' if csp.backtracking_search(**options) is not None else 'unsolvable'
+        except BudgetExceeded:
+            status = 'budget'
+    else:
+        search = IterativeSearch(csp, **options)
+        try:
+            search.run(max_nodes)
+        finally:
+            search.close()
+        status = {'solved': 'solved', 'exhausted': 'unsolvable'}.get(search.status, 'budget')
+    runtime = time.process_time() - start_time
+    return runtime, status, stats.nodes, stats.constraint_checks
+
+
+def run(
+    names: list[str] | None = None,
+    configs: list[str] | None = None,
+    repetitions: int = 5,
+    warmup: int = 1,
+    max_nodes: int = 20000,
+    min_time: float = 0.05,
+) -> list[dict]:
+    """Runs the benchmarks and returns one result per instance and configuration.
+
+    Each result has the keys instance, config, status, seconds (the median over the
+    repetitions, after warmup unmeasured runs), nodes and checks. A repetition solves the
+    instance as many times as it takes to run for min_time seconds and counts the mean time.
+    """
+    builders = instances()
+    results = []
+    for name in names or list(builders):
+        for config_name in configs or list(CONFIGS):
+            config = CONFIGS[config_name]
+            for _ in range(warmup):
+                run_once(builders[name], config, max_nodes)
+            times = []
+            for _ in range(repetitions):
+                total = 0.0
+                runs = 0
+                while runs == 0 or total < min_time:
+                    runtime, status, nodes, checks = run_once(builders[name], config, max_nodes)
+                    total += runtime
+                    runs += 1
+                times.append(total / runs)
+            results.append({
+                'instance': name,
+                'config': config_name,
+                'status': status,
+                'seconds': statistics.median(times),
+                'nodes': nodes,
+                'checks': checks,
+            })
+    return results
+
+
+def compare(
+    results: list[dict], baseline: list[dict], tolerance: float = 0.25, min_slowdown: float = 0.005
+) -> list[str]:
+    """Flags the results that regressed against the baseline.
+
+    A result regresses if its time exceeds the baseline's by more than the tolerance (a
+    fraction) and by more than min_slowdown seconds, if it needs more nodes or checks, or if
+    its status changed.
+
+    Returns
+    -------
+    list[str]
+        For each result, a note on how it compares ('' if it is not in the baseline), starting
+        with 'REGRESSION' for regressions
+    """
+    previous = {(result['instance'], result['config']): result for result in baseline}
+    notes = []
+    for result in results:
+        old = previous.get((result['instance'], result['config']))
+        if old is None:
+            notes.append('')
+            continue
+        problems = []
+        if result['status'] != old['status']:
+            problems.append(f"status {old['status']} -> {result['status']}")
+        for key in ('nodes', 'checks'):
+            if result[key] > old[key]:
+                problems.append(f'{key} {old[key]} -> {result[key]}')
+        ratio = result['seconds'] / max(old['seconds'], 1e-9)
+        if ratio > 1 + tolerance and result['seconds'] - old['seconds'] > min_slowdown:
+            problems.append(f'time x{ratio:.2f}')
+        notes.append('REGRESSION: ' + ', '.join(problems) if problems else f'time x{ratio:.2f}')
+    return notes
+
+
+def format_table(results: list[dict], notes: list[str] | None = None) -> str:
+    lines = [f"{'instance':<18}{'config':<9}{'status':<12}{'seconds':>10}{'nodes':>10}{'checks':>12}  note"]
+    for i, result in enumerate(results):
+        lines.append(
+            f"{result['instance']:<18}{result['config']:<9}{result['status']:<12}"
+            f"{result['seconds']:>10.4f}{result['nodes']:>10}{result['checks']:>12}  {notes[i] if notes else ''}"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if os.environ.get('PYTHONHASHSEED') != '0':
+        os.environ['PYTHONHASHSEED'] = '0'
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    parser = argparse.ArgumentParser(description='Benchmark the CSP solver configurations.')
+    parser.add_argument('--instances', nargs='+', choices=list(instances()), help='instances to run (default: all)')
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), help='configurations to run (default: all)')
+    parser.add_argument('-r', '--repetitions', type=int, default=5, help='measured runs per benchmark (default: 5)')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs per benchmark (default: 1)')
+    parser.add_argument('--max-nodes', type=int, default=20000, help='node budget per search (default: 20000)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per measured run, repeating fast searches (default: 0.05)')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file written by --save to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown as a fraction (default: 0.25)')
+    parser.add_argument('--min-slowdown', type=float, default=0.005, help='slowdowns in seconds never flagged (default: 0.005)')
+    args = parser.parse_args()
+
+    results = run(args.instances, args.configs, args.repetitions, args.warmup, args.max_nodes, args.min_time)
+    notes = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            notes = compare(results, json.load(file)['results'], args.tolerance, args.min_slowdown)
+    print(format_table(results, notes))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'max_nodes': args.max_nodes, 'results': results}, file, indent=2)
+    if notes and any(note.startswith('REGRESSION') for note in notes):
+        sys.exit(1)
@@ -1,7 +1,249 @@
 from typing import Any
 from queue import Queue
 
-from collections import deque
+import csv
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter, perf_counter_ns
+
+
+class _NotEqual:
+    """Marker relation for a binary constraint that only requires value1 != value2."""
+
+    def __repr__(self):
+        return 'NOT_EQUAL'
+
+    def __reduce__(self):
+        # Pickle by reference so the marker keeps its identity across processes
+        return 'NOT_EQUAL'
+
+
+NOT_EQUAL = _NotEqual()
+
+
+class BitsetDomain:
+    """A set-like domain stored as an int bitmask over a value index shared by all domains of a CSP.
+
+    Supports the set operations the CSP uses (iteration, len, in, add, remove, discard and copy),
+    so ac_3(), revise() and the search code work on it unchanged. Emptiness, singleton and
+    membership tests are bit operations and copying a domain only copies an int.
+    """
+
+    __slots__ = ('mask', 'values', 'index')
+
+    def __init__(self, values: list, index: dict[Any, int], mask: int = 0):
+        self.values = values
+        self.index = index
+        self.mask = mask
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            lowest = mask & -mask
+            yield self.values[lowest.bit_length() - 1]
+            mask ^= lowest
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __bool__(self):
+        return self.mask != 0
+
+    def __contains__(self, value):
+        i = self.index.get(value)
+        return i is not None and (self.mask >> i) & 1 == 1
+
+    def __eq__(self, other):
+        if isinstance(other, BitsetDomain) and other.values is self.values:
+            return self.mask == other.mask
+        return set(self) == set(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(set(self)) if self.mask else 'set()'
+
+    def add(self, value):
+        self.mask |= 1 << self.index[value]
+
+    def remove(self, value):
+        bit = 1 << self.index[value]
+        if not self.mask & bit:
+            raise KeyError(value)
+        self.mask ^= bit
+
+    def discard(self, value):
+        i = self.index.get(value)
+        if i is not None:
+            self.mask &= ~(1 << i)
+
+    def copy(self):
+        return BitsetDomain(self.values, self.index, self.mask)
+
+    def is_singleton(self):
+        return self.mask != 0 and self.mask & (self.mask - 1) == 0
+
+
+def bitset_domains(domains: dict[str, set], values: list | None = None) -> dict[str, BitsetDomain]:
+    """Converts set domains to BitsetDomains sharing a single value index.
+
+    Parameters
+    ----------
+    domains : dict[str, set]
+        The domains of the variables
+    values : list | None
+        The value index to use, which must contain every value of the domains. By default it is
+        built from the domains.
+
+    Returns
+    -------
+    dict[str, BitsetDomain]
+        The same domains, stored as bitmasks
+    """
+    if values is None:
+        values = list({value for domain in domains.values() for value in domain})
+        try:
+            values.sort()
+        except TypeError:
+            pass
+    index = {value: i for i, value in enumerate(values)}
+    return {
+        variable: BitsetDomain(values, index, sum(1 << index[value] for value in domain))
+        for variable, domain in domains.items()
+    }
+
+
+class NogoodStore:
+    """A bounded store of nogoods: partial assignments known not to extend to a solution.
+
+    Nogoods are indexed by each of their (variable, value) literals. When more than limit
+    nogoods are stored, the least recently used one is evicted.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.nogoods: OrderedDict[frozenset, None] = OrderedDict()
+        self.index: dict[tuple[str, Any], set[frozenset]] = {}
+        self.hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.nogoods)
+
+    def add(self, nogood: frozenset):
+        """Stores a nogood, given as a frozenset of (variable, value) literals."""
+        if nogood in self.nogoods:
+            self.nogoods.move_to_end(nogood)
+            return
+        self.nogoods[nogood] = None
+        for literal in nogood:
+            self.index.setdefault(literal, set()).add(nogood)
+        if len(self.nogoods) > self.limit:
+            evicted, _ = self.nogoods.popitem(last=False)
+            for literal in evicted:
+                self.index[literal].discard(evicted)
+            self.evictions += 1
+
+    def violated(self, var, value, assignment) -> frozenset | None:
+        """Returns a nogood that var=value would complete under the assignment, if there is one."""
+        for nogood in self.index.get((var, value), ()):
+            if all(other == var or assignment.get(other, assignment) == other_value for other, other_value in nogood):
+                self.nogoods.move_to_end(nogood)
+                self.hits += 1
+                return nogood
+        return None
+
+
+class SolverStats:
+    """Counters and timers collected while solving a CSP, see CSP.enable_stats().
+
+    The CSP only updates them behind a single `stats is not None` check, so solving without
+    stats costs (almost) nothing. Counts accumulate over every ac_3() and search run on the CSP
+    until reset() is called.
+
+    Attributes
+    ----------
+    nodes, failures : int
+        Search nodes expanded (calls to backtrack()) and nodes whose values all failed
+    revise_calls, constraint_checks : int
+        Calls to revise(), and value pairs checked against a constraint by revise() and
+        is_consistent()
+    alldiff_filters : int
+        Runs of the AllDifferent filtering
+    domain_removals : int
+        Values removed from domains, by propagation or search
+    phase_ns : dict[str, int]
+        Nanoseconds spent in 'ac_3', 'search' and, within search, 'inference'
+    nodes_by_depth, failures_by_depth : Counter | None
+        Nodes and failures per search depth, or None if histograms are disabled
+    """
+
+    COUNTERS = ('nodes', 'failures', 'revise_calls', 'constraint_checks', 'alldiff_filters', 'domain_removals')
+
+    def __init__(self, histograms: bool = False):
+        self.histograms = histograms
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.failures = 0
+        self.revise_calls = 0
+        self.constraint_checks = 0
+        self.alldiff_filters = 0
+        self.domain_removals = 0
+        self.phase_ns: dict[str, int] = {}
+        self.nodes_by_depth: Counter | None = Counter() if self.histograms else None
+        self.failures_by_depth: Counter | None = Counter() if self.histograms else None
+
+    def node(self, depth: int):
+        self.nodes += 1
+        if self.nodes_by_depth is not None:
+            self.nodes_by_depth[depth] += 1
+
+    def failure(self, depth: int):
+        self.failures += 1
+        if self.failures_by_depth is not None:
+            self.failures_by_depth[depth] += 1
+
+    def add_time(self, phase: str, nanoseconds: int):
+        self.phase_ns[phase] = self.phase_ns.get(phase, 0) + nanoseconds
+
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the counters, the phase times and, if enabled, the histograms as plain data."""
+        data: dict[str, Any] = {name: getattr(self, name) for name in self.COUNTERS}
+        data['phase_ns'] = dict(self.phase_ns)
+        if self.histograms:
+            data['nodes_by_depth'] = dict(sorted(self.nodes_by_depth.items()))
+            data['failures_by_depth'] = dict(sorted(self.failures_by_depth.items()))
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict())
+
+    def to_csv(self) -> str:
+        """Returns the stats as CSV rows of metric, depth and value. depth is empty except for
+        histogram rows, and phase times are given as phase_ns rows named after their phase.
+        """
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(('metric', 'depth', 'value'))
+        for name in self.COUNTERS:
+            writer.writerow((name, '', getattr(self, name)))
+        for phase, nanoseconds in self.phase_ns.items():
+            writer.writerow((f'{phase}_ns', '', nanoseconds))
+        if self.histograms:
+            for name in ('nodes_by_depth', 'failures_by_depth'):
+                for depth, count in sorted(getattr(self, name).items()):
+                    writer.writerow((name, depth, count))
+        return output.getvalue()
 
 
 class CSP:
@@ -10,9 +252,11 @@ class CSP:
         variables: list[str],
         domains: dict[str, set],
         edges: list[tuple[str, str]],
+        alldiffs: list[list[str]] | None = None,
+        bitset: bool = False,
     ):
         """Constructs a CSP instance with the given variables, domains and edges.
-        
+
         Parameters
         ----------
         variables : list[str]
@@ -21,11 +265,18 @@ class CSP:
             The domains of the variables
         edges : list[tuple[str, str]]
             Pairs of variables that must not be assigned the same value
+        alldiffs : list[list[str]] | None
+            Groups of variables that must all be assigned different values, propagated as
+            n-ary AllDifferent constraints instead of being expanded into pairwise edges
+        bitset : bool
+            Store the domains as BitsetDomains instead of sets, which is faster for small integer domains
         """
         self.variables = variables
-        self.domains = domains
+        self.domains = bitset_domains(domains) if bitset else domains
 
-        # Binary constraints as a dictionary mapping variable pairs to a set of value pairs.
+        # Binary constraints as a dictionary mapping variable pairs to either NOT_EQUAL or a set of
+        # allowed value pairs. Edges are stored as NOT_EQUAL and checked directly with value1 != value2,
+        # explicit value pair tables are only kept for extensional constraints (see add_constraint()).
         #
         # To check if variable1=value1, variable2=value2 is in violation of a binary constraint:
         # if (
@@ -36,267 +287,1707 @@ class CSP:
         #     (value1, value2) not in self.binary_constraints[(variable2, variable1)]
         # ):
         #     Violates a binary constraint
-        self.binary_constraints: dict[tuple[str, str], set] = {}
+        #
+        # constraints() performs this lookup and additionally evaluates NOT_EQUAL relations. Each
+        # unordered pair is stored under one orientation only, add_edge() and add_constraint()
+        # merge into an existing entry in either orientation.
+        self.binary_constraints: dict[tuple[str, str], Any] = {}
+
+        # Adjacency index mapping each variable to the variables it shares any constraint with.
+        # Kept in sync by add_edge(), add_constraint() and add_alldiff(), so neighbor lookups cost
+        # O(degree) instead of O(constraints). binary_neighbors only covers binary_constraints and
+        # drives the arcs of ac_3().
+        self.neighbors: dict[str, set[str]] = {variable: set() for variable in variables}
+        self.binary_neighbors: dict[str, set[str]] = {variable: set() for variable in variables}
+
+        # AllDifferent constraints as lists of variables. alldiff_peers maps each variable to the
+        # variables it must differ from through them, and variable_alldiffs to the indices of the
+        # AllDifferent constraints it takes part in.
+        self.alldiff_constraints: list[list[str]] = []
+        self.alldiff_peers: dict[str, set[str]] = {variable: set() for variable in variables}
+        self.variable_alldiffs: dict[str, list[int]] = {variable: [] for variable in variables}
+
+        # Domain removals as (variable, value) pairs, recorded while searching with inference so
+        # they can be undone on backtrack. None when no search is recording.
+        self.trail: list[tuple[str, Any]] | None = None
+        self.inference: str | None = None
+
+        # Source of randomness for the 'random' value ordering, see restart_search()
+        self.rng: random.Random | None = None
+
+        # Values to try first for some variables regardless of the value ordering, such as those
+        # of a previous solution (see IncrementalSolver)
+        self.preferred: dict[str, Any] | None = None
+
+        # Search heuristics, see backtracking_search(). For MRV, buckets[k][d] holds the unassigned
+        # variables with k values left and d unassigned neighbors (dicts used as ordered sets),
+        # bucket_counts[k] the number of variables in buckets[k] and unassigned_degree the number of
+        # unassigned neighbors of every variable. All are updated incrementally on domain changes
+        # and (de)selection.
+        self.variable_ordering = 'first'
+        self.value_ordering = 'default'
+        self.buckets: list[list[dict[str, None]]] | None = None
+        self.bucket_counts: list[int] = []
+        self.unassigned_degree: dict[str, int] = {}
+
+        # Conflict-directed backjumping: the search depth of every assigned variable and the
+        # learned nogoods, if nogood learning is enabled
+        self.backjumping = False
+        self.assigned_depth: dict[str, int] = {}
+        self.nogoods: NogoodStore | None = None
+
+        # Search and propagation statistics, None unless enabled with enable_stats()
+        self.stats: SolverStats | None = None
+
+        # The last support found for each (xi, xj) and x by the residual-support strategy of
+        # ac_3(), as residues[(xi, xj)][x]. Dropped for a pair whenever its relation changes.
+        self.residues: dict[tuple[str, str], dict[Any, Any]] = {}
+
         for variable1, variable2 in edges:
-            self.binary_constraints[(variable1, variable2)] = set()
-            for value1 in self.domains[variable1]:
-                for value2 in self.domains[variable2]:
-                    if value1 != value2:
-                        self.binary_constraints[(variable1, variable2)].add((value1, value2))
-                        self.binary_constraints[(variable1, variable2)].add((value2, value1))
-
-    def ac_3(self):
+            self.add_edge(variable1, variable2)
+        for group in alldiffs or []:
+            self.add_alldiff(group)
+
+    def add_edge(self, variable1: str, variable2: str):
+        """Adds a constraint that variable1 and variable2 must not be assigned the same value.
+
+        Parameters
+        ----------
+        variable1 : str
+            The first variable of the edge
+        variable2 : str
+            The second variable of the edge
+        """
+        for key in ((variable1, variable2), (variable2, variable1)):
+            allowed = self.binary_constraints.get(key)
+            if allowed is NOT_EQUAL:
+                return
+            if allowed is not None:
+                # Tighten the existing table instead of keeping two relations for the same pair
+                self.binary_constraints[key] = {(value1, value2) for value1, value2 in allowed if value1 != value2}
+                self._relation_changed(variable1, variable2)
+                return
+        self.binary_constraints[(variable1, variable2)] = NOT_EQUAL
+        self._link(variable1, variable2)
+
+    def add_constraint(self, variable1: str, variable2: str, allowed: set[tuple[Any, Any]]):
+        """Adds an extensional binary constraint given by its table of allowed value pairs.
+
+        Parameters
+        ----------
+        variable1 : str
+            The first variable of the constraint
+        variable2 : str
+            The second variable of the constraint
+        allowed : set[tuple[Any, Any]]
+            The pairs (value1, value2) that variable1 and variable2 may be assigned together
+        """
+        allowed = set(allowed)
+        if (variable2, variable1) in self.binary_constraints:
+            variable1, variable2 = variable2, variable1
+            allowed = {(value2, value1) for value1, value2 in allowed}
+        existing = self.binary_constraints.get((variable1, variable2))
+        if existing is NOT_EQUAL:
+            allowed = {(value1, value2) for value1, value2 in allowed if value1 != value2}
+        elif existing is not None:
+            allowed &= existing
+        self.binary_constraints[(variable1, variable2)] = allowed
+        self._relation_changed(variable1, variable2)
+        self._link(variable1, variable2)
+
+    def add_alldiff(self, variables: list[str]):
+        """Adds an AllDifferent constraint over the given variables.
+
+        Parameters
+        ----------
+        variables : list[str]
+            The variables that all must be different
+        """
+        index = len(self.alldiff_constraints)
+        self.alldiff_constraints.append(list(variables))
+        for variable in variables:
+            self.variable_alldiffs[variable].append(index)
+            for other in variables:
+                if other != variable:
+                    self.alldiff_peers[variable].add(other)
+                    self.neighbors[variable].add(other)
+                    self.residues.pop((variable, other), None)
+
+    def remove_edge(self, variable1: str, variable2: str):
+        """Removes the binary constraint between variable1 and variable2, whether it was added by
+        add_edge() or add_constraint(). AllDifferent constraints over both are kept.
+
+        Raises
+        ------
+        KeyError
+            If there is no binary constraint between the variables
+        """
+        if (variable1, variable2) in self.binary_constraints:
+            del self.binary_constraints[(variable1, variable2)]
+        else:
+            del self.binary_constraints[(variable2, variable1)]
+        self.binary_neighbors[variable1].discard(variable2)
+        self.binary_neighbors[variable2].discard(variable1)
+        self._relation_changed(variable1, variable2)
+        if variable2 not in self.alldiff_peers[variable1]:
+            self.neighbors[variable1].discard(variable2)
+            self.neighbors[variable2].discard(variable1)
+
+    def _relation_changed(self, variable1: str, variable2: str):
+        # Residual supports found under the old relation may no longer be supports
+        self.residues.pop((variable1, variable2), None)
+        self.residues.pop((variable2, variable1), None)
+
+    def _link(self, variable1: str, variable2: str):
+        self.neighbors[variable1].add(variable2)
+        self.neighbors[variable2].add(variable1)
+        self.binary_neighbors[variable1].add(variable2)
+        self.binary_neighbors[variable2].add(variable1)
+
+    def components(self) -> list[list[str]]:
+        """Returns the connected components of the constraint graph.
+
+        Variables in different components share no constraint, so each component can be solved
+        on its own. Components are ordered by their first variable, and the variables within a
+        component keep their order in variables.
+        """
+        component: dict[str, int] = {}
+        count = 0
+        for start in self.variables:
+            if start in component:
+                continue
+            component[start] = count
+            stack = [start]
+            while stack:
+                var = stack.pop()
+                for neighbor in self.neighbors[var]:
+                    if neighbor not in component:
+                        component[neighbor] = count
+                        stack.append(neighbor)
+            count += 1
+        groups: list[list[str]] = [[] for _ in range(count)]
+        for var in self.variables:
+            groups[component[var]].append(var)
+        return groups
+
+    def subproblem(self, variables: list[str]) -> 'CSP':
+        """Returns a new CSP over variables with copies of their domains and every constraint
+        among them. Constraints with variables outside of the list are dropped, so variables
+        should be a union of components() for the subproblem to be independent of the rest.
+        """
+        keep = set(variables)
+        csp = CSP(list(variables), {var: self.domains[var].copy() for var in variables}, [])
+        for (variable1, variable2), relation in self.binary_constraints.items():
+            if variable1 in keep and variable2 in keep:
+                csp.binary_constraints[(variable1, variable2)] = relation
+                csp._link(variable1, variable2)
+        for group in self.alldiff_constraints:
+            if keep.issuperset(group):
+                csp.add_alldiff(group)
+        csp.stats = self.stats
+        return csp
+
+    def compile(self) -> 'CompiledCSP':
+        """Returns an immutable, integer-indexed copy of the variables and constraints of the CSP.
+
+        See CompiledCSP. Only not-equal edges and AllDifferent constraints can be compiled.
+        """
+        return CompiledCSP.from_csp(self)
+
+    def enable_stats(self, histograms: bool = False) -> SolverStats:
+        """Starts collecting statistics in a new SolverStats, which is returned and kept in stats.
+
+        With histograms, nodes and failures are also counted per search depth.
+        """
+        self.stats = SolverStats(histograms)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def snapshot_domains(self) -> dict[str, Any]:
+        """Returns a copy of the current domains that can be passed to restore_domains()."""
+        return {variable: domain.copy() for variable, domain in self.domains.items()}
+
+    def restore_domains(self, snapshot: dict[str, Any]):
+        """Restores the domains to a copy returned by snapshot_domains()."""
+        self.domains = {variable: domain.copy() for variable, domain in snapshot.items()}
+
+    def remove_value(self, var, value):
+        """Removes value from the domain of var, recording it on the trail if one is active."""
+        domain = self.domains[var]
+        domain.remove(value)
+        if self.stats is not None:
+            self.stats.domain_removals += 1
+        if self.trail is not None:
+            self.trail.append((var, value))
+        if self.buckets is not None:
+            size = len(domain)
+            degree = self.unassigned_degree[var]
+            bucket = self.buckets[size + 1][degree]
+            if var in bucket:
+                del bucket[var]
+                self.buckets[size][degree][var] = None
+                self.bucket_counts[size + 1] -= 1
+                self.bucket_counts[size] += 1
+
+    def undo(self, mark: int):
+        """Puts back every domain removal recorded on the trail after position mark."""
+        trail = self.trail
+        domains = self.domains
+        buckets = self.buckets
+        while len(trail) > mark:
+            var, value = trail.pop()
+            domain = domains[var]
+            domain.add(value)
+            if buckets is not None:
+                size = len(domain)
+                degree = self.unassigned_degree[var]
+                bucket = buckets[size - 1][degree]
+                if var in bucket:
+                    del bucket[var]
+                    buckets[size][degree][var] = None
+                    self.bucket_counts[size - 1] -= 1
+                    self.bucket_counts[size] += 1
+
+    def ac_3(self, strategy: str = 'ac3'):
         """Performs AC-3 on the CSP.
         Meant to be run prior to calling backtracking_search() to reduce the search for some problems.
-        
+
+        Parameters
+        ----------
+        strategy : str
+            'ac3' for plain AC-3, or 'ac3rm' to reuse the last support found for each value
+            (residual supports) and keep every arc in the queue at most once
+
         Returns
         -------
         bool
             False if a domain becomes empty, otherwise True
         """
-        queue = deque(self.binary_constraints.keys())
+        queue = deque((xi, xj) for xi in self.variables for xj in self.binary_neighbors[xi])
+        queue.extend(range(len(self.alldiff_constraints)))
+        if self.stats is None:
+            return self.propagate(queue, strategy)
+        start_time = perf_counter_ns()
+        try:
+            return self.propagate(queue, strategy)
+        finally:
+            self.stats.add_time('ac_3', perf_counter_ns() - start_time)
+
+    def propagate(self, queue: deque, strategy: str = 'ac3') -> bool:
+        """Runs arc consistency until the queue is empty.
+
+        Parameters
+        ----------
+        queue : deque
+            Arcs (xi, xj) to revise and indices of AllDifferent constraints to filter
+        strategy : str
+            'ac3' or 'ac3rm', see ac_3()
+
+        Returns
+        -------
+        bool
+            False if a domain becomes empty, otherwise True
+        """
+        if strategy not in ('ac3', 'ac3rm'):
+            raise ValueError(f'Unknown arc consistency strategy {strategy!r}')
+        revise = self.revise_residual if strategy == 'ac3rm' else self.revise
+
+        # AllDifferent constraints are always queued at most once, with ac3rm arcs are too
+        if strategy == 'ac3rm':
+            pending = set(queue)
+            if len(pending) < len(queue):
+                queue = deque(dict.fromkeys(queue))
+        else:
+            pending = {item for item in queue if type(item) is int}
 
         while queue:
-            (xi, xj) = queue.popleft()
-            if self.revise(xi, xj):
-                if not self.domains[xi]:
-                    return False 
-                for xk in self.get_neighbors(xi):
-                    if xk != xj:
+            item = queue.popleft()
+            if type(item) is int:
+                pending.discard(item)
+                changed = self.filter_alldiff(item)
+                if changed is None:
+                    return False
+            else:
+                pending.discard(item)
+                if not revise(*item):
+                    continue
+                if not self.domains[item[0]]:
+                    return False
+                changed = (item[0],)
+
+            for xi in changed:
+                for xk in self.binary_neighbors[xi]:
+                    if item != (xi, xk) and (xk, xi) not in pending:
                         queue.append((xk, xi))
+                        if strategy == 'ac3rm':
+                            pending.add((xk, xi))
+                for index in self.variable_alldiffs[xi]:
+                    if index != item and index not in pending:
+                        pending.add(index)
+                        queue.append(index)
         return True
 
     def revise(self, xi, xj):
+        stats = self.stats
+        if stats is not None:
+            stats.revise_calls += 1
+        if self.binary_constraints.get((xi, xj), self.binary_constraints.get((xj, xi))) is NOT_EQUAL:
+            # A value only loses its support when xj is down to that very value
+            if len(self.domains[xj]) == 1:
+                for y in self.domains[xj]:
+                    if y in self.domains[xi]:
+                        self.remove_value(xi, y)
+                        return True
+            return False
+
         revised = False
+        checks = 0
         for x in self.domains[xi].copy():
-            if all(not self.constraints(xi, x, xj, y) for y in self.domains[xj]):
-                self.domains[xi].remove(x)
+            for y in self.domains[xj]:
+                checks += 1
+                if self.constraints(xi, x, xj, y):
+                    break
+            else:
+                self.remove_value(xi, x)
                 revised = True
+        if stats is not None:
+            stats.constraint_checks += checks
         return revised
 
+    def revise_residual(self, xi, xj):
+        """Like revise(), but first checks whether the support last found for a value is still in D(xj).
+
+        Supports are stored in both directions: if y supports xi=x, x also supports xj=y.
+        """
+        if self.binary_constraints.get((xi, xj), self.binary_constraints.get((xj, xi))) is NOT_EQUAL:
+            return self.revise(xi, xj)
+
+        stats = self.stats
+        if stats is not None:
+            stats.revise_calls += 1
+        residues = self.residues.setdefault((xi, xj), {})
+        reverse = self.residues.setdefault((xj, xi), {})
+        domain_j = self.domains[xj]
+        revised = False
+        checks = 0
+        for x in self.domains[xi].copy():
+            y = residues.get(x, residues)
+            if y is not residues and y in domain_j:
+                continue
+            for y in domain_j:
+                checks += 1
+                if self.constraints(xi, x, xj, y):
+                    residues[x] = y
+                    reverse[y] = x
+                    break
+            else:
+                self.remove_value(xi, x)
+                revised = True
+        if stats is not None:
+            stats.constraint_checks += checks
+        return revised
+
+    def filter_alldiff(self, index: int) -> list[str] | None:
+        """Makes an AllDifferent constraint generalized arc consistent with Regin's algorithm.
+
+        A value is kept only if it is part of some maximum matching between the variables and
+        their values. This also catches Hall sets (k variables sharing k values) and pigeonhole
+        failures that pairwise not-equal arcs cannot see.
+
+        Parameters
+        ----------
+        index : int
+            Index into alldiff_constraints
+
+        Returns
+        -------
+        list[str] | None
+            The variables whose domains were reduced, or None if the constraint cannot be satisfied
+        """
+        if self.stats is not None:
+            self.stats.alldiff_filters += 1
+        changed: dict[str, None] = {}
+
+        # Variables fixed to a single value take it away from the others. Repeated until no more
+        # variables get fixed, only the remaining ones need the matching.
+        variables = self.alldiff_constraints[index]
+        used = set()
+        while True:
+            fixed_values = []
+            for var in variables:
+                if len(self.domains[var]) == 1:
+                    (value,) = self.domains[var]
+                    if value in used:
+                        return None
+                    used.add(value)
+                    fixed_values.append(value)
+            if not fixed_values:
+                break
+            variables = [var for var in variables if len(self.domains[var]) != 1]
+            for var in variables:
+                domain = self.domains[var]
+                for value in fixed_values:
+                    if value in domain:
+                        self.remove_value(var, value)
+                        changed[var] = None
+                if not domain:
+                    return None
+
+        domains = [self.domains[var] for var in variables]
+        n = len(variables)
+
+        # Maximum matching of variables to values using augmenting paths
+        match_value: list[Any] = [None] * n
+        match_variable: dict[Any, int] = {}
+
+        def augment(i, visited):
+            for value in domains[i]:
+                if value not in visited:
+                    visited.add(value)
+                    j = match_variable.get(value)
+                    if j is None or augment(j, visited):
+                        match_value[i] = value
+                        match_variable[value] = i
+                        return True
+            return False
+
+        for i in range(n):
+            if not augment(i, set()):
+                return None
+
+        # Residual graph: variable i -> its matched value, value -> every variable it is unmatched with
+        values = list({value for domain in domains for value in domain})
+        value_ids = {value: n + k for k, value in enumerate(values)}
+        successors: list[list[int]] = [[value_ids[match_value[i]]] for i in range(n)]
+        successors.extend([] for _ in values)
+        for i, domain in enumerate(domains):
+            for value in domain:
+                if value != match_value[i]:
+                    successors[value_ids[value]].append(i)
+
+        # Edges on an even alternating path starting in an unmatched value are consistent
+        reached = [False] * len(successors)
+        stack = [value_ids[value] for value in values if value not in match_variable]
+        for node in stack:
+            reached[node] = True
+        while stack:
+            for successor in successors[stack.pop()]:
+                if not reached[successor]:
+                    reached[successor] = True
+                    stack.append(successor)
+
+        # So are edges inside a strongly connected component (iterative Tarjan)
+        component = [-1] * len(successors)
+        lowlink = [0] * len(successors)
+        order = [-1] * len(successors)
+        on_stack = [False] * len(successors)
+        scc_stack: list[int] = []
+        counter = 0
+        for root in range(len(successors)):
+            if order[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, k = work.pop()
+                if k == 0:
+                    order[node] = lowlink[node] = counter
+                    counter += 1
+                    scc_stack.append(node)
+                    on_stack[node] = True
+                if k < len(successors[node]):
+                    work.append((node, k + 1))
+                    successor = successors[node][k]
+                    if order[successor] == -1:
+                        work.append((successor, 0))
+                    elif on_stack[successor]:
+                        lowlink[node] = min(lowlink[node], order[successor])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == order[node]:
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack[member] = False
+                        component[member] = node
+                        if member == node:
+                            break
+
+        for i, domain in enumerate(domains):
+            removed = [
+                value for value in domain
+                if value != match_value[i] and not reached[value_ids[value]]
+                and component[value_ids[value]] != component[i]
+            ]
+            if removed:
+                for value in removed:
+                    self.remove_value(variables[i], value)
+                changed[variables[i]] = None
+        return list(changed)
+
     def get_neighbors(self, var):
-        neighbors = set()
-        for (xi, xj) in self.binary_constraints:
-            if xi == var:
-                neighbors.add(xj)
-            elif xj == var:
-                neighbors.add(xi)
-        return neighbors
+        return self.neighbors[var]
 
     def constraints(self, var1, value1, var2, value2):
+        if value1 == value2 and var2 in self.alldiff_peers[var1]:
+            return False
         if (var1, var2) in self.binary_constraints:
-            return (value1, value2) in self.binary_constraints[(var1, var2)]
+            allowed = self.binary_constraints[(var1, var2)]
         elif (var2, var1) in self.binary_constraints:
-            return (value2, value1) in self.binary_constraints[(var2, var1)]
+            allowed = self.binary_constraints[(var2, var1)]
+            value1, value2 = value2, value1
         else:
             return True
+        if allowed is NOT_EQUAL:
+            return value1 != value2
+        return (value1, value2) in allowed
+
+    def backtracking_search(
+        self,
+        inference: str | None = None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
+        backjumping: bool = False,
+        nogood_limit: int = 0,
+    ):
+        """Performs backtracking search on the CSP.
+
+        Parameters
+        ----------
+        inference : str | None
+            None to only check assignments against assigned neighbors, 'forward' to remove the
+            values of the neighbors that conflict with every assignment (forward checking), or
+            'mac' to maintain arc consistency after every assignment. Domains are restored when
+            the search returns.
+        variable_ordering : str
+            'first' picks the first unassigned variable, 'mrv' the one with the fewest remaining
+            values, breaking ties by the most unassigned neighbors (degree heuristic). Without
+            pruning every domain keeps its size, so MRV with inference None forward checks.
+        value_ordering : str
+            'default' tries values in domain order, 'lcv' tries the least constraining value first
+            and 'random' tries them in random order (using rng if set)
+        backjumping : bool
+            Use conflict-directed backjumping: on a dead end, jump back to the most recent variable
+            in its conflict set instead of the previous one. Cannot be combined with inference or
+            MRV.
+        nogood_limit : int
+            With backjumping, learn the conflict set of every dead end as a nogood and keep up to
+            this many of them, checked by is_consistent(). 0 disables learning.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            A complete assignment, or None if the CSP has no solution
+        """
+        self.start_search(inference, variable_ordering, value_ordering, backjumping, nogood_limit)
+        start_time = perf_counter_ns()
+        try:
+            if backjumping:
+                return self.backjump({})[0]
+            return self.backtrack({})
+        finally:
+            self.end_search()
+            if self.stats is not None:
+                self.stats.add_time('search', perf_counter_ns() - start_time)
+
+    def decomposed_search(self, workers: int = 1, **options) -> dict[str, Any] | None:
+        """Solves every connected component of the constraint graph as a separate CSP and
+        combines their solutions.
+
+        Parameters
+        ----------
+        workers : int
+            The number of processes to solve components in, 1 to solve them one after another
+            in this process
+        options
+            The keyword options of backtracking_search()
+
+        Returns
+        -------
+        dict[str, Any] | None
+            A complete assignment, or None if some component has no solution
+        """
+        subproblems = [self.subproblem(group) for group in self.components()]
+        if workers > 1 and len(subproblems) > 1:
+            for csp in subproblems:
+                csp.stats = None
+            with ProcessPoolExecutor(max_workers=min(workers, len(subproblems))) as executor:
+                futures = [executor.submit(_search_subproblem, csp, options) for csp in subproblems]
+                results = [future.result() for future in futures]
+        else:
+            results = []
+            for csp in subproblems:
+                result = csp.backtracking_search(**options)
+                if result is None:
+                    return None
+                results.append(result)
+
+        solution: dict[str, Any] = {}
+        for result in results:
+            if result is None:
+                return None
+            solution.update(result)
+        return solution
+
+    def restart_search(
+        self,
+        schedule: str | None = 'luby',
+        scale: int = 100,
+        growth: float = 1.5,
+        max_nodes: int | None = None,
+        time_limit: float | None = None,
+        cancel=None,
+        seed: int | None = None,
+        inference: str | None = None,
+        variable_ordering: str = 'mrv',
+        value_ordering: str = 'random',
+        check_interval: int = 16,
+    ) -> 'RestartResult':
+        """Runs randomized searches that restart after a growing number of failures (dead ends).
+
+        Every restart shuffles the order the variables are considered in (which breaks MRV ties
+        differently) and, with the 'random' value ordering, the order of the values, so an
+        unlucky early choice does not trap the whole search in a barren subtree. The cutoff counts
+        failures rather than nodes, so a search that is making progress without backtracking
+        is never restarted, however many variables the CSP has.
+
+        Parameters
+        ----------
+        schedule : str
+            'luby' for restarts after scale * (1, 1, 2, 1, 1, 2, 4, ...) failures (see luby()),
+            or 'geometric' for scale * growth ** i failures. None runs a single search in the
+            given variable order that is never restarted, but still honours the budgets and cancel.
+        scale, growth : int, float
+            The failure unit of the schedule and the growth factor of the geometric schedule
+        max_nodes : int | None
+            The number of nodes to expand over all restarts, or None for no limit
+        time_limit : float | None
+            The number of seconds to search for, or None for no limit
+        cancel
+            An object with an is_set() method, like threading.Event or multiprocessing.Event.
+            The search stops soon after it is set.
+        seed : int | None
+            Seed for the random orderings, None for a different run every time
+        inference, variable_ordering, value_ordering
+            As for backtracking_search()
+        check_interval : int
+            The number of nodes expanded between checks of max_nodes, the time limit and cancel
+
+        Returns
+        -------
+        RestartResult
+            The solution or the reason the search stopped, and its statistics
+        """
+        if schedule not in ('luby', 'geometric', None):
+            raise ValueError(f'Unknown restart schedule {schedule!r}')
+        deadline = perf_counter() + time_limit if time_limit is not None else None
+        previous_stats, previous_rng, variables = self.stats, self.rng, self.variables
+        stats = self.stats = previous_stats if previous_stats is not None else SolverStats()
+        self.rng = random.Random(seed)
+        result = RestartResult(None, 'budget', stats)
+        try:
+            i = 0
+            while True:
+                if schedule is None:
+                    limit = None
+                elif schedule == 'luby':
+                    limit = scale * luby(i + 1)
+                else:
+                    limit = max(1, round(scale * growth ** i))
+                if max_nodes is not None and result.nodes >= max_nodes:
+                    return result
+                result.restarts = i
+
+                if schedule is not None:
+                    self.variables = self.rng.sample(variables, len(variables))
+                search = IterativeSearch(self, inference, variable_ordering, value_ordering)
+                try:
+                    while limit is None or search.failures < limit:
+                        if cancel is not None and cancel.is_set():
+                            result.status = 'cancelled'
+                            break
+                        if deadline is not None and perf_counter() >= deadline:
+                            break
+                        interval = check_interval
+                        if max_nodes is not None:
+                            interval = min(interval, max_nodes - result.nodes - search.nodes)
+                            if interval <= 0:
+                                break
+                        solution = search.run(interval, limit - search.failures if limit is not None else None)
+                        if solution is not None:
+                            result.solution = dict(solution)
+                        if search.status != 'suspended':
+                            break
+                finally:
+                    result.nodes += search.nodes
+                    search.close()
+
+                if search.status == 'solved':
+                    result.status = 'solved'
+                elif search.status == 'exhausted':
+                    # Every restart is a complete search, so running out of values proves there
+                    # is no solution
+                    result.status = 'unsolvable'
+                if result.status != 'budget' or (deadline is not None and perf_counter() >= deadline):
+                    return result
+                i += 1
+        finally:
+            self.stats, self.rng, self.variables = previous_stats, previous_rng, variables
+
+    def portfolio_search(
+        self,
+        workers: int | None = None,
+        configs: list[dict] | None = None,
+        max_nodes: int | None = None,
+        time_limit: float | None = None,
+        seed: int = 0,
+    ) -> 'RestartResult':
+        """Races differently configured restart_search() runs in a process pool.
+
+        The first worker to solve the CSP or prove it unsolvable cancels the others, so the
+        search takes about as long as the configuration that suits this CSP best.
+
+        Parameters
+        ----------
+        workers : int | None
+            The number of worker processes, None for one per CPU
+        configs : list[dict] | None
+            Keyword options of restart_search() for the workers, assigned round-robin.
+            Defaults to PORTFOLIO.
+        max_nodes, time_limit : int | None, float | None
+            Budgets of every worker, as for restart_search()
+        seed : int
+            Worker i searches with seed + i
+
+        Returns
+        -------
+        RestartResult
+            The result of the first worker to settle the CSP, or if every worker ran out of
+            budget, one of their results
+        """
+        configs = configs or PORTFOLIO
+        workers = workers or os.cpu_count() or 1
+        cancel = multiprocessing.Event()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_portfolio_worker, initargs=(cancel,)) as executor:
+            pending = {
+                executor.submit(
+                    _portfolio_worker, self,
+                    {'max_nodes': max_nodes, 'time_limit': time_limit, **configs[i % len(configs)], 'seed': seed + i},
+                )
+                for i in range(workers)
+            }
+            result = None
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        outcome = future.result()
+                        if outcome.status in ('solved', 'unsolvable'):
+                            cancel.set()
+                            if result is None or result.status not in ('solved', 'unsolvable'):
+                                result = outcome
+                        elif result is None:
+                            result = outcome
+            finally:
+                # Also stop the other workers when one raised, or leaving the executor waits for them
+                cancel.set()
+            return result
+
+    def iterative_search(
+        self,
+        inference: str | None = None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
+    ):
+        """Same as backtracking_search(), but without recursion, so the number of variables is not
+        bounded by the recursion limit. See IterativeSearch for searches that can be suspended.
+        """
+        search = IterativeSearch(self, inference, variable_ordering, value_ordering)
+        try:
+            result = search.run()
+            return dict(result) if result is not None else None
+        finally:
+            search.close()
 
-    def backtracking_search(self):
-        return self.backtrack({})
+    def solutions(
+        self,
+        limit: int | None = None,
+        inference: str | None = None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
+    ):
+        """Yields the solutions of the CSP one at a time, as the search finds them.
+
+        Parameters
+        ----------
+        limit : int | None
+            Stop after this many solutions (for example 2 to check that a solution is unique),
+            or None for all of them
+        inference, variable_ordering, value_ordering
+            As for backtracking_search()
+
+        Yields
+        ------
+        dict[str, Any]
+            A complete assignment
+        """
+        search = IterativeSearch(self, inference, variable_ordering, value_ordering)
+        try:
+            found = 0
+            while limit is None or found < limit:
+                result = search.run()
+                if result is None:
+                    return
+                found += 1
+                yield dict(result)
+        finally:
+            search.close()
+
+    def count_solutions(
+        self,
+        limit: int | None = None,
+        inference: str | None = None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
+    ) -> int:
+        """Counts the solutions of the CSP without building a dictionary for each of them.
+
+        Memory use only depends on the size of the CSP, not on the number of solutions. When the
+        constraint graph has several connected components, their solutions are counted
+        separately and multiplied, instead of enumerating every combination of them.
+
+        Parameters
+        ----------
+        limit : int | None
+            Stop counting at this many solutions, or None to count all of them
+        inference, variable_ordering, value_ordering
+            As for backtracking_search()
+
+        Returns
+        -------
+        int
+            The number of solutions found
+        """
+        groups = self.components()
+        if len(groups) > 1:
+            # Unless a count is 0, the product is at least as large as each count, so counting
+            # every component only up to limit still gives the exact product capped at limit
+            total = 1
+            for group in groups:
+                count = self.subproblem(group).count_solutions(limit, inference, variable_ordering, value_ordering)
+                if count == 0:
+                    return 0
+                total *= count
+            return total if limit is None else min(total, limit)
+
+        search = IterativeSearch(self, inference, variable_ordering, value_ordering)
+        try:
+            count = 0
+            while (limit is None or count < limit) and search.run() is not None:
+                count += 1
+            return count
+        finally:
+            search.close()
+
+    def start_search(
+        self,
+        inference: str | None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
+        backjumping: bool = False,
+        nogood_limit: int = 0,
+    ):
+        if inference not in (None, 'forward', 'mac'):
+            raise ValueError(f'Unknown inference {inference!r}')
+        if variable_ordering not in ('first', 'mrv'):
+            raise ValueError(f'Unknown variable ordering {variable_ordering!r}')
+        if value_ordering not in ('default', 'lcv', 'random'):
+            raise ValueError(f'Unknown value ordering {value_ordering!r}')
+        if backjumping and inference is not None:
+            raise ValueError('Conflict-directed backjumping cannot be combined with inference')
+        if backjumping and variable_ordering == 'mrv':
+            # Conflict sets only explain the values tried, not values removed by forward checking
+            raise ValueError('Conflict-directed backjumping cannot be combined with MRV')
+        if variable_ordering == 'mrv' and inference is None:
+            inference = 'forward'
+        if nogood_limit and not backjumping:
+            raise ValueError('Nogood learning requires backjumping')
+        self.backjumping = backjumping
+        self.assigned_depth = {}
+        self.nogoods = NogoodStore(nogood_limit) if nogood_limit else None
+        self.inference = inference
+        self.trail = [] if inference else None
+        self.variable_ordering = variable_ordering
+        self.value_ordering = value_ordering
+        if variable_ordering == 'mrv':
+            max_size = max(map(len, self.domains.values()), default=0)
+            max_degree = max(map(len, self.neighbors.values()), default=0)
+            self.buckets = [[{} for _ in range(max_degree + 1)] for _ in range(max_size + 1)]
+            self.bucket_counts = [0] * (max_size + 1)
+            self.unassigned_degree = {var: len(self.neighbors[var]) for var in self.variables}
+            for var in self.variables:
+                self.buckets[len(self.domains[var])][self.unassigned_degree[var]][var] = None
+                self.bucket_counts[len(self.domains[var])] += 1
+
+    def end_search(self):
+        if self.trail is not None:
+            self.undo(0)
+        self.inference = None
+        self.trail = None
+        self.variable_ordering = 'first'
+        self.value_ordering = 'default'
+        self.buckets = None
+        self.bucket_counts = []
+        self.unassigned_degree = {}
+        self.backjumping = False
+        self.assigned_depth = {}
+        self.nogoods = None
 
     def backtrack(self, assignment):
+        if self.stats is not None:
+            self.stats.node(len(assignment))
         if len(assignment) == len(self.variables):
             return assignment
-        
+
         var = self.select_unassigned_variable(assignment)
-        
+
         for value in self.order_domain_values(var, assignment):
             if self.is_consistent(var, value, assignment):
                 assignment[var] = value
-                
-                result = self.backtrack(assignment)
-                if result:
-                    return result
-                
+                mark = len(self.trail) if self.trail is not None else 0
+
+                if self.infer(var, value):
+                    result = self.backtrack(assignment)
+                    if result:
+                        return result
+
+                if self.trail is not None:
+                    self.undo(mark)
                 del assignment[var]
-        
-        return None  
 
-    def select_unassigned_variable(self, assignment):
-        return [v for v in self.variables if v not in assignment][0]
+        self.deselect_variable(var)
+        if self.stats is not None:
+            self.stats.failure(len(assignment))
+        return None
 
-    def order_domain_values(self, var, assignment):
-        return list(self.domains[var])
+    def backjump(self, assignment) -> tuple[dict[str, Any] | None, set[str]]:
+        """Backtracking with conflict-directed backjumping.
 
-    def is_consistent(self, var, value, assignment):
-        for neighbor in self.get_neighbors(var):
-            if neighbor in assignment and not self.constraints(var, value, neighbor, assignment[neighbor]):
+        Returns
+        -------
+        tuple[dict[str, Any] | None, set[str]]
+            A complete assignment or None, and on failure the conflict set: the assigned variables
+            that together rule out every value of the variable that failed
+        """
+        if self.stats is not None:
+            self.stats.node(len(assignment))
+        if len(assignment) == len(self.variables):
+            return assignment, set()
+
+        var = self.select_unassigned_variable(assignment)
+        conflicts: set[str] = set()
+
+        for value in self.order_domain_values(var, assignment):
+            culprits = self.conflict_set(var, value, assignment)
+            if culprits is not None:
+                conflicts |= culprits
+                continue
+
+            assignment[var] = value
+            self.assigned_depth[var] = len(assignment)
+            result, child_conflicts = self.backjump(assignment)
+            if result:
+                return result, set()
+            del assignment[var]
+            del self.assigned_depth[var]
+
+            if var not in child_conflicts:
+                # The failure below does not depend on var, so no other value of var can fix it
+                self.deselect_variable(var)
+                return None, child_conflicts
+            conflicts |= child_conflicts
+            conflicts.discard(var)
+
+        self.deselect_variable(var)
+        if self.stats is not None:
+            self.stats.failure(len(assignment))
+        if self.nogoods is not None:
+            self.nogoods.add(frozenset((other, assignment[other]) for other in conflicts))
+        return None, conflicts
+
+    def conflict_set(self, var, value, assignment) -> set[str] | None:
+        """Returns the assigned variables that rule out var=value, or None if it is consistent.
+
+        For a binary conflict only the earliest assigned culprit is returned, so backjumping can
+        jump as far back as possible.
+        """
+        culprit = None
+        stats = self.stats
+        for neighbor in self.neighbors[var]:
+            if neighbor in assignment:
+                if stats is not None:
+                    stats.constraint_checks += 1
+                if not self.constraints(var, value, neighbor, assignment[neighbor]):
+                    if culprit is None or self.assigned_depth[neighbor] < self.assigned_depth[culprit]:
+                        culprit = neighbor
+        if culprit is not None:
+            return {culprit}
+        if self.nogoods is not None:
+            nogood = self.nogoods.violated(var, value, assignment)
+            if nogood is not None:
+                return {other for other, _ in nogood if other != var}
+        return None
+
+    def infer(self, var, value) -> bool:
+        """Runs the configured inference after assigning var=value.
+
+        Forward checking removes the values of the neighbors of var that conflict with value. With
+        MAC the domain of var is reduced to value and AC-3 is run incrementally, starting from the
+        arcs pointing at var. All removals are recorded on the trail.
+
+        Returns
+        -------
+        bool
+            False if some domain became empty, otherwise True
+        """
+        if self.inference is None:
+            return True
+        if self.stats is None:
+            return self._infer(var, value)
+        start_time = perf_counter_ns()
+        try:
+            return self._infer(var, value)
+        finally:
+            self.stats.add_time('inference', perf_counter_ns() - start_time)
+
+    def _infer(self, var, value) -> bool:
+        if self.inference == 'forward':
+            return self.forward_check(var, value)
+        for other in list(self.domains[var]):
+            if other != value:
+                self.remove_value(var, other)
+        queue = deque((xk, var) for xk in self.binary_neighbors[var])
+        queue.extend(self.variable_alldiffs[var])
+        return self.propagate(queue)
+
+    def forward_check(self, var, value) -> bool:
+        """Removes the values of the neighbors of var that conflict with var=value.
+
+        Returns
+        -------
+        bool
+            False if the domain of some neighbor became empty, otherwise True
+        """
+        stats = self.stats
+        for neighbor in self.neighbors[var]:
+            domain = self.domains[neighbor]
+            if self.not_equal_only(var, neighbor):
+                if stats is not None:
+                    stats.constraint_checks += 1
+                if value in domain:
+                    self.remove_value(neighbor, value)
+            else:
+                if stats is not None:
+                    stats.constraint_checks += len(domain)
+                for y in list(domain):
+                    if not self.constraints(var, value, neighbor, y):
+                        self.remove_value(neighbor, y)
+            if not domain:
                 return False
         return True
 
+    def select_unassigned_variable(self, assignment):
+        if self.buckets is None:
+            return [v for v in self.variables if v not in assignment][0]
 
-def alldiff(variables: list[str]) -> list[tuple[str, str]]:
-    """Returns a list of edges interconnecting all of the input variables
-    
-    Parameters
-    ----------
-    variables : list[str]
-        The variables that all must be different
+        # Minimum remaining values, ties broken by the number of unassigned neighbors
+        for size, count in enumerate(self.bucket_counts):
+            if count:
+                row = self.buckets[size]
+                for degree in range(len(row) - 1, -1, -1):
+                    if row[degree]:
+                        var = next(iter(row[degree]))
+                        del row[degree][var]
+                        self.bucket_counts[size] -= 1
+                        self._shift_neighbor_degrees(var, -1)
+                        return var
 
-    Returns
-    -------
-    list[tuple[str, str]]
-        List of edges in the form (a, b)
-    """
-    return [(variables[i], variables[j]) for i in range(len(variables) - 1) for j in range(i + 1, len(variables))]
+    def deselect_variable(self, var):
+        """Returns a variable picked by select_unassigned_variable() to the unassigned pool."""
+        if self.buckets is not None:
+            size = len(self.domains[var])
+            self.buckets[size][self.unassigned_degree[var]][var] = None
+            self.bucket_counts[size] += 1
+            self._shift_neighbor_degrees(var, 1)
 
-from typing import Any
-from queue import Queue
+    def _shift_neighbor_degrees(self, var, delta):
+        buckets = self.buckets
+        degrees = self.unassigned_degree
+        for neighbor in self.neighbors[var]:
+            degree = degrees[neighbor]
+            degrees[neighbor] = degree + delta
+            row = buckets[len(self.domains[neighbor])]
+            if neighbor in row[degree]:
+                del row[degree][neighbor]
+                row[degree + delta][neighbor] = None
 
-from collections import deque
+    def order_domain_values(self, var, assignment):
+        values = self._ordered_values(var, assignment)
+        preferred = self.preferred
+        if preferred is not None and var in preferred and preferred[var] in self.domains[var]:
+            values.remove(preferred[var])
+            values.insert(0, preferred[var])
+        return values
 
+    def _ordered_values(self, var, assignment) -> list:
+        if self.value_ordering == 'random':
+            values = list(self.domains[var])
+            (self.rng or random).shuffle(values)
+            return values
+        if self.value_ordering != 'lcv':
+            return list(self.domains[var])
+
+        # Least constraining value: fewest values ruled out in the domains of unassigned neighbors
+        neighbors = [neighbor for neighbor in self.neighbors[var] if neighbor not in assignment]
+
+        def ruled_out(value):
+            count = 0
+            for neighbor in neighbors:
+                domain = self.domains[neighbor]
+                if self.not_equal_only(var, neighbor):
+                    count += value in domain
+                else:
+                    count += sum(1 for y in domain if not self.constraints(var, value, neighbor, y))
+            return count
+
+        return sorted(self.domains[var], key=ruled_out)
+
+    def not_equal_only(self, var1, var2) -> bool:
+        """Returns whether the only constraint between var1 and var2 is that they differ."""
+        relation = self.binary_constraints.get((var1, var2), self.binary_constraints.get((var2, var1)))
+        return relation is NOT_EQUAL or (relation is None and var2 in self.alldiff_peers[var1])
+
+    def is_consistent(self, var, value, assignment):
+        stats = self.stats
+        for neighbor in self.neighbors[var]:
+            if neighbor in assignment:
+                if stats is not None:
+                    stats.constraint_checks += 1
+                if not self.constraints(var, value, neighbor, assignment[neighbor]):
+                    return False
+        if self.nogoods is not None and self.nogoods.violated(var, value, assignment) is not None:
+            return False
+        return True
+
+
+class IterativeSearch:
+    """Backtracking search over a CSP driven by an explicit stack instead of recursion.
+
+    Takes the same options as CSP.backtracking_search(). The search can be suspended by giving
+    run() a node budget and resumed by calling run() again, and after a solution is found the
+    next call to run() continues with the next one. The CSP is in search mode (trail and
+    heuristic bookkeeping active) until the search is exhausted or close() is called, so only
+    one search should run on a CSP at a time.
+    """
 
-class CSP:
     def __init__(
         self,
-        variables: list[str],
-        domains: dict[str, set],
-        edges: list[tuple[str, str]],
+        csp: CSP,
+        inference: str | None = None,
+        variable_ordering: str = 'first',
+        value_ordering: str = 'default',
     ):
-        """Constructs a CSP instance with the given variables, domains and edges.
-        
+        self.csp = csp
+        self.assignment: dict[str, Any] = {}
+        # Frames of [variable, values to try, index of the next value, trail mark of the current
+        # value or -1 when the variable has no value]
+        self.stack: list[list] = []
+        self.nodes = 0
+        self.failures = 0
+        self.status = 'ready'
+        self.closed = False
+        self._descend = True
+        csp.start_search(inference, variable_ordering, value_ordering)
+
+    def run(self, max_nodes: int | None = None, max_failures: int | None = None) -> dict[str, Any] | None:
+        """Runs the search until a solution is found, the search space is exhausted, or max_nodes
+        more nodes have been expanded or max_failures more dead ends reached.
+
+        Parameters
+        ----------
+        max_nodes : int | None
+            The number of nodes to expand before suspending, or None for no limit
+        max_failures : int | None
+            The number of failures to backtrack from before suspending, or None for no limit
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The solution (the live assignment, copy it to keep it past the next run()), or None.
+            status tells whether the search is 'solved', 'exhausted' or 'suspended'.
+        """
+        stats = self.csp.stats
+        if stats is None:
+            return self._run(max_nodes, max_failures)
+        start_time = perf_counter_ns()
+        try:
+            return self._run(max_nodes, max_failures)
+        finally:
+            stats.add_time('search', perf_counter_ns() - start_time)
+
+    def _run(self, max_nodes: int | None, max_failures: int | None) -> dict[str, Any] | None:
+        if self.closed:
+            return None
+
+        csp = self.csp
+        stats = csp.stats
+        assignment = self.assignment
+        stack = self.stack
+        variables = csp.variables
+        n = len(variables)
+        first = csp.buckets is None
+        is_consistent = csp.is_consistent
+        infer = csp.infer
+        budget = self.nodes + max_nodes if max_nodes is not None else None
+        failure_budget = self.failures + max_failures if max_failures is not None else None
+
+        while True:
+            if self._descend:
+                if budget is not None and self.nodes >= budget:
+                    self.status = 'suspended'
+                    return None
+                # The complete assignment counts as a node too, as in CSP.backtrack()
+                self.nodes += 1
+                if stats is not None:
+                    stats.node(len(assignment))
+                if len(assignment) == n:
+                    self._descend = False
+                    self.status = 'solved'
+                    return assignment
+                # With 'first' ordering the variables are assigned in order
+                var = variables[len(assignment)] if first else csp.select_unassigned_variable(assignment)
+                stack.append([var, csp.order_domain_values(var, assignment), 0, -1])
+            elif not stack:
+                # Resumed after the empty solution of a CSP without variables
+                self.status = 'exhausted'
+                self.close()
+                return None
+
+            frame = stack[-1]
+            var, values, i, mark = frame
+            trail = csp.trail
+            if mark >= 0:
+                if trail is not None:
+                    csp.undo(mark)
+                del assignment[var]
+                frame[3] = -1
+
+            self._descend = False
+            while i < len(values):
+                value = values[i]
+                i += 1
+                if is_consistent(var, value, assignment):
+                    assignment[var] = value
+                    mark = len(trail) if trail is not None else 0
+                    if infer(var, value):
+                        frame[2] = i
+                        frame[3] = mark
+                        self._descend = True
+                        break
+                    if trail is not None:
+                        csp.undo(mark)
+                    del assignment[var]
+
+            if not self._descend:
+                self.failures += 1
+                if stats is not None:
+                    stats.failure(len(assignment))
+                csp.deselect_variable(var)
+                stack.pop()
+                if not stack:
+                    self.status = 'exhausted'
+                    self.close()
+                    return None
+                if failure_budget is not None and self.failures >= failure_budget:
+                    self.status = 'suspended'
+                    return None
+
+    def close(self):
+        """Ends the search and restores the domains of the CSP."""
+        if not self.closed:
+            self.closed = True
+            self.csp.end_search()
+
+
+class CompiledCSP:
+    """The constraint graph of a CSP in an immutable, integer-indexed form.
+
+    Variables are numbered by their position in variables, and the constraints and adjacency
+    are stored as flat int arrays (CSR style: offsets into a member array). A compiled model can
+    be saved to disk and memory-mapped back with load(), and instantiate() turns it into a CSP
+    for new initial domains without rebuilding the constraints, so many problems that share a
+    constraint graph (for example Sudoku puzzles) only pay for it once.
+
+    Use CSP.compile() to create one.
+    """
+
+    MAGIC = b'CSPMODEL1\n'
+    ARRAYS = (
+        'edges',
+        'alldiff_offsets', 'alldiff_members',
+        'neighbor_offsets', 'neighbor_ids',
+        'binary_neighbor_offsets', 'binary_neighbor_ids',
+    )
+
+    def __init__(self, variables: list[str], values: list, arrays: dict[str, memoryview], buffer=None):
+        self.variables = tuple(variables)
+        self.values = tuple(values)
+        self.arrays = arrays
+        # Keeps a memory-mapped file open for as long as its arrays are in use
+        self._buffer = buffer
+        self._decoded = None
+
+    @classmethod
+    def from_csp(cls, csp: CSP) -> 'CompiledCSP':
+        ids = {var: i for i, var in enumerate(csp.variables)}
+        edges = array('i')
+        for (variable1, variable2), allowed in csp.binary_constraints.items():
+            if allowed is not NOT_EQUAL:
+                raise ValueError(f'Cannot compile the extensional constraint between {variable1} and {variable2}')
+            edges.extend((ids[variable1], ids[variable2]))
+
+        def csr(groups):
+            offsets, members = array('i', [0]), array('i')
+            for group in groups:
+                members.extend(ids[var] for var in group)
+                offsets.append(len(members))
+            return offsets, members
+
+        arrays = {'edges': edges}
+        arrays['alldiff_offsets'], arrays['alldiff_members'] = csr(csp.alldiff_constraints)
+        arrays['neighbor_offsets'], arrays['neighbor_ids'] = csr(
+            sorted(csp.neighbors[var], key=ids.__getitem__) for var in csp.variables
+        )
+        arrays['binary_neighbor_offsets'], arrays['binary_neighbor_ids'] = csr(
+            sorted(csp.binary_neighbors[var], key=ids.__getitem__) for var in csp.variables
+        )
+
+        values = list({value for domain in csp.domains.values() for value in domain})
+        try:
+            values.sort()
+        except TypeError:
+            pass
+        return cls(
+            csp.variables,
+            values,
+            {name: memoryview(data.tobytes()).cast('i') for name, data in arrays.items()},
+        )
+
+    def save(self, path: str):
+        """Writes the model to a file that load() can memory-map.
+
+        The variables and the value index are stored as JSON, so the values must be JSON
+        serializable. Arrays are stored as native-endian 32-bit ints.
+        """
+        try:
+            header = json.dumps({
+                'variables': self.variables,
+                'values': self.values,
+                'lengths': [len(self.arrays[name]) for name in self.ARRAYS],
+            }).encode()
+        except TypeError as error:
+            raise ValueError(f'Cannot save the model: {error}') from error
+        # Pad the header so the arrays start 4-byte aligned
+        header += b' ' * (-(len(self.MAGIC) + 4 + len(header)) % 4)
+        with open(path, 'wb') as file:
+            file.write(self.MAGIC)
+            file.write(struct.pack('<I', len(header)))
+            file.write(header)
+            for name in self.ARRAYS:
+                file.write(self.arrays[name].tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledCSP':
+        """Memory-maps a model written by save()."""
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(cls.MAGIC)] != cls.MAGIC:
+            buffer.close()
+            raise ValueError(f'{path} is not a compiled CSP model')
+        offset = len(cls.MAGIC)
+        (header_length,) = struct.unpack_from('<I', buffer, offset)
+        offset += 4
+        header = json.loads(buffer[offset:offset + header_length])
+        offset += header_length
+
+        view = memoryview(buffer)
+        arrays = {}
+        for name, length in zip(cls.ARRAYS, header['lengths']):
+            arrays[name] = view[offset:offset + 4 * length].cast('i')
+            offset += 4 * length
+        return cls(header['variables'], header['values'], arrays, buffer)
+
+    def _python_structures(self):
+        # Decoded once per model, then copied for every instance
+        if self._decoded is None:
+            names = self.variables
+            arrays = self.arrays
+
+            def groups(offsets, members):
+                return [[names[i] for i in members[offsets[k]:offsets[k + 1]]] for k in range(len(offsets) - 1)]
+
+            edges = arrays['edges']
+            binary_constraints = {(names[edges[k]], names[edges[k + 1]]): NOT_EQUAL for k in range(0, len(edges), 2)}
+            alldiffs = groups(arrays['alldiff_offsets'], arrays['alldiff_members'])
+            neighbors = dict(zip(names, groups(arrays['neighbor_offsets'], arrays['neighbor_ids'])))
+            binary_neighbors = dict(zip(names, groups(arrays['binary_neighbor_offsets'], arrays['binary_neighbor_ids'])))
+
+            alldiff_peers = {var: set() for var in names}
+            variable_alldiffs = {var: [] for var in names}
+            for index, group in enumerate(alldiffs):
+                for var in group:
+                    variable_alldiffs[var].append(index)
+                    alldiff_peers[var].update(group)
+            for var in names:
+                alldiff_peers[var].discard(var)
+            self._decoded = (binary_constraints, alldiffs, neighbors, binary_neighbors, alldiff_peers, variable_alldiffs)
+        return self._decoded
+
+    def instantiate(self, domains: dict[str, set], bitset: bool = False) -> CSP:
+        """Creates a CSP with this model's constraints and the given domains.
+
         Parameters
         ----------
-        variables : list[str]
-            The variables for the CSP
         domains : dict[str, set]
             The domains of the variables
-        edges : list[tuple[str, str]]
-            Pairs of variables that must not be assigned the same value
-        """
-        self.variables = variables
-        self.domains = domains
+        bitset : bool
+            As for CSP(). The model's value index is used when it covers the domains.
 
-        # Binary constraints as a dictionary mapping variable pairs to a set of value pairs.
-        #
-        # To check if variable1=value1, variable2=value2 is in violation of a binary constraint:
-        # if (
-        #     (variable1, variable2) in self.binary_constraints and
-        #     (value1, value2) not in self.binary_constraints[(variable1, variable2)]
-        # ) or (
-        #     (variable2, variable1) in self.binary_constraints and
-        #     (value1, value2) not in self.binary_constraints[(variable2, variable1)]
-        # ):
-        #     Violates a binary constraint
-        self.binary_constraints: dict[tuple[str, str], set] = {}
-        for variable1, variable2 in edges:
-            self.binary_constraints[(variable1, variable2)] = set()
-            for value1 in self.domains[variable1]:
-                for value2 in self.domains[variable2]:
-                    if value1 != value2:
-                        self.binary_constraints[(variable1, variable2)].add((value1, value2))
-                        self.binary_constraints[(variable1, variable2)].add((value2, value1))
-
-    def ac_3(self):
-        """Performs AC-3 on the CSP.
-        Meant to be run prior to calling backtracking_search() to reduce the search for some problems.
-        
         Returns
         -------
-        bool
-            False if a domain becomes empty, otherwise True
+        CSP
+            A new CSP, which can be modified without affecting the model or other instances
         """
-        queue = deque(self.binary_constraints.keys())
+        binary_constraints, alldiffs, neighbors, binary_neighbors, alldiff_peers, variable_alldiffs = (
+            self._python_structures()
+        )
+        csp = CSP(list(self.variables), domains, [], bitset=False)
+        if bitset:
+            values = list(self.values)
+            known = set(values)
+            if not all(value in known for domain in domains.values() for value in domain):
+                values = None
+            csp.domains = bitset_domains(domains, values)
+        csp.binary_constraints = dict(binary_constraints)
+        csp.neighbors = {var: set(group) for var, group in neighbors.items()}
+        csp.binary_neighbors = {var: set(group) for var, group in binary_neighbors.items()}
+        csp.alldiff_constraints = list(alldiffs)
+        csp.alldiff_peers = {var: set(peers) for var, peers in alldiff_peers.items()}
+        csp.variable_alldiffs = {var: list(indices) for var, indices in variable_alldiffs.items()}
+        return csp
 
-        while queue:
-            (xi, xj) = queue.popleft()
-            if self.revise(xi, xj):
-                if not self.domains[xi]:
-                    return False 
-                for xk in self.get_neighbors(xi):
-                    if xk != xj:
-                        queue.append((xk, xi))
-        return True
 
-    def revise(self, xi, xj):
-        revised = False
-        for x in self.domains[xi].copy():
-            if all(not self.constraints(xi, x, xj, y) for y in self.domains[xj]):
-                self.domains[xi].remove(x)
-                revised = True
-        return revised
-    
+class IncrementalSolver:
+    """Keeps a CSP propagated and solved while its constraints and domains change.
 
-    def get_neighbors(self, var):
-        neighbors = set()
-        for (xi, xj) in self.binary_constraints:
-            if xi == var:
-                neighbors.add(xj)
-            elif xj == var:
-                neighbors.add(xi)
-        return neighbors
+    Tightening the CSP (add_edge(), add_constraint(), restrict_domain()) only queues the arcs
+    into the changed variables, so the next solve() propagates from there instead of running
+    AC-3 over the whole CSP. Removing an edge can bring back pruned values, so the domains of
+    the affected connected component are reset and only that component is propagated again.
 
-    def constraints(self, var1, value1, var2, value2):
-        if (var1, var2) in self.binary_constraints:
-            return (value1, value2) in self.binary_constraints[(var1, var2)]
-        elif (var2, var1) in self.binary_constraints:
-            return (value2, value1) in self.binary_constraints[(var2, var1)]
+    The last solution is kept: solve() returns it unchanged if it still satisfies the CSP, and
+    otherwise searches with its values tried first, which usually repairs it with few changes.
+
+    Domain changes must go through the solver rather than to the CSP directly.
+    """
+
+    def __init__(self, csp: CSP, **options):
+        """
+        Parameters
+        ----------
+        csp : CSP
+            The CSP, whose domains are the starting point
+        options
+            The keyword options of CSP.backtracking_search() used by solve()
+        """
+        self.csp = csp
+        self.options = options
+        # The domains before propagation, to reset to when a constraint is removed
+        self.base_domains = csp.snapshot_domains()
+        # Arcs and AllDifferent indices to propagate, None when everything needs to be
+        self.queue: deque | None = None
+        # The last solution while it is still valid, and the last one found, to guide repairs
+        self.solution: dict[str, Any] | None = None
+        self.hint: dict[str, Any] | None = None
+
+    def add_edge(self, variable1: str, variable2: str):
+        self.csp.add_edge(variable1, variable2)
+        self._tightened((variable1, variable2), (variable2, variable1))
+        if self.solution is not None and self.solution[variable1] == self.solution[variable2]:
+            self.solution = None
+
+    def add_constraint(self, variable1: str, variable2: str, allowed: set[tuple[Any, Any]]):
+        self.csp.add_constraint(variable1, variable2, allowed)
+        self._tightened((variable1, variable2), (variable2, variable1))
+        if self.solution is not None and (self.solution[variable1], self.solution[variable2]) not in allowed:
+            self.solution = None
+
+    def restrict_domain(self, var: str, values):
+        """Removes every value not in values from the domain of var."""
+        for value in list(self.base_domains[var]):
+            if value not in values:
+                self.base_domains[var].remove(value)
+        for value in list(self.csp.domains[var]):
+            if value not in values:
+                self.csp.remove_value(var, value)
+        self._tightened(*((xk, var) for xk in self.csp.binary_neighbors[var]), *self.csp.variable_alldiffs[var])
+        if self.solution is not None and self.solution[var] not in values:
+            self.solution = None
+
+    def remove_edge(self, variable1: str, variable2: str):
+        csp = self.csp
+        csp.remove_edge(variable1, variable2)
+        if self.queue is None:
+            return
+        reset = set()
+        for group in csp.components():
+            if variable1 in group or variable2 in group:
+                reset.update(group)
+        for var in reset:
+            csp.domains[var] = self.base_domains[var].copy()
+        self._tightened(
+            *((xk, var) for var in reset for xk in csp.binary_neighbors[var]),
+            *{index for var in reset for index in csp.variable_alldiffs[var]},
+        )
+
+    def _tightened(self, *items):
+        if self.queue is not None:
+            self.queue.extend(items)
+
+    def solve(self) -> dict[str, Any] | None:
+        """Propagates the changes since the last call and returns a solution, or None if the CSP
+        has none. The returned dictionary must not be modified.
+        """
+        csp = self.csp
+        if self.queue is None:
+            csp.domains = {var: domain.copy() for var, domain in self.base_domains.items()}
+            consistent = csp.ac_3()
         else:
-            return True
+            consistent = csp.propagate(self.queue)
+        if not consistent:
+            # Part of the queue may not have been processed, so start over after the next change
+            self.queue = None
+            self.solution = None
+            return None
+        self.queue = deque()
 
-     # Initialize counters
-    backtrack_calls = 0
-    backtrack_failures = 0
+        if self.solution is None:
+            previous = csp.preferred
+            csp.preferred = self.hint
+            try:
+                self.solution = csp.backtracking_search(**self.options)
+            finally:
+                csp.preferred = previous
+            if self.solution is not None:
+                self.hint = self.solution
+        return self.solution
 
-def backtracking_search_with_counts(csp):
-    """Performs backtracking search and counts the number of calls and failures."""
-    from time import time
 
-    # Use nonlocal variables to modify counters within nested function
-    counters = {'calls': 0, 'failures': 0}
+class RestartResult:
+    """The outcome of CSP.restart_search().
 
-    def backtrack(assignment):
-        counters['calls'] += 1
+    Attributes
+    ----------
+    solution : dict[str, Any] | None
+        The solution, if one was found
+    status : str
+        'solved', 'unsolvable', 'cancelled', or 'budget' if the node or time budget ran out
+    stats : SolverStats
+        Statistics over all restarts
+    restarts : int
+        The number of restarts, 0 if the first search settled it
+    nodes : int
+        The number of nodes expanded over all restarts
+    """
 
-        # If assignment is complete, return it
-        if len(assignment) == len(csp.variables):
-            return assignment
+    def __init__(self, solution: dict[str, Any] | None, status: str, stats: SolverStats):
+        self.solution = solution
+        self.status = status
+        self.stats = stats
+        self.restarts = 0
+        self.nodes = 0
 
-        # Select an unassigned variable
-        var = csp.select_unassigned_variable(assignment)
+    def __repr__(self):
+        return f'RestartResult(status={self.status!r}, restarts={self.restarts}, nodes={self.nodes})'
 
-        # Try each possible value in the domain
-        for value in csp.order_domain_values(var, assignment):
-            if csp.is_consistent(var, value, assignment):
-                assignment[var] = value
 
-                # Recursive call
-                result = backtrack(assignment)
-                if result:
-                    return result
+def luby(i: int) -> int:
+    """Returns the i-th term (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
 
-                # Backtrack
-                del assignment[var]
 
-        # Increment failure counter
-        counters['failures'] += 1
-        return None  # Failure
+# The default configurations of portfolio_search(): MAC with MRV and LCV without restarts, for CSPs
+# that one well-ordered search settles faster than any restart schedule, and with restarts or
+# random value orders, and forward checking with MRV for CSPs where full propagation costs more
+# than it saves
+PORTFOLIO: list[dict] = [
+    {'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'lcv', 'schedule': None},
+    {'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'lcv'},
+    {'inference': 'mac', 'variable_ordering': 'mrv', 'value_ordering': 'random', 'schedule': 'geometric'},
+    {'inference': 'forward', 'variable_ordering': 'mrv', 'value_ordering': 'lcv'},
+    {'inference': 'mac', 'variable_ordering': 'first', 'value_ordering': 'random'},
+]
 
-    # Measure the runtime of backtracking search
-    start_time = time()
-    result = backtrack({})
-    end_time = time()
-    runtime = end_time - start_time
+# Set by the process running portfolio_search() once a worker has settled the CSP
+_cancel_event = None
 
-    # Return the result and statistics
-    return result, counters['calls'], counters['failures'], runtime 
 
-    def select_unassigned_variable(self, assignment):
-        return [v for v in self.variables if v not in assignment][0]
+def _init_portfolio_worker(cancel):
+    global _cancel_event
+    _cancel_event = cancel
 
-    def order_domain_values(self, var, assignment):
-        return list(self.domains[var])
 
-    def is_consistent(self, var, value, assignment):
-        for neighbor in self.get_neighbors(var):
-            if neighbor in assignment and not self.constraints(var, value, neighbor, assignment[neighbor]):
-                return False
-        return True
+def _portfolio_worker(csp: CSP, options: dict) -> RestartResult:
+    return csp.restart_search(cancel=_cancel_event, **options)
+
+
+def _search_subproblem(csp: CSP, options: dict) -> dict[str, Any] | None:
+    return csp.backtracking_search(**options)
+
+
+def backtracking_search_with_counts(csp, **options):
+    """Performs backtracking search and counts the number of calls and failures.
+
+    Takes the same keyword options as CSP.backtracking_search(). Kept for older callers, the
+    counts come from a SolverStats enabled for the duration of the search (see CSP.enable_stats()).
+
+    Returns
+    -------
+    tuple[dict[str, Any] | None, int, int, float]
+        The solution, the number of calls and failures, and the search time in seconds
+    """
+    previous = csp.stats
+    stats = csp.enable_stats()
+    try:
+        result = csp.backtracking_search(**options)
+    finally:
+        csp.stats = previous
+    return result, stats.nodes, stats.failures, stats.phase_ns['search'] / 1e9
 
 
 def alldiff(variables: list[str]) -> list[tuple[str, str]]:
     """Returns a list of edges interconnecting all of the input variables
-    
+
     Parameters
     ----------
     variables : list[str]
@@ -22,6 +22,8 @@ csp = CSP(
 )
 
 print(csp.backtracking_search())
+print(f'Number of colorings: {csp.count_solutions()}')
 
 # Example output after implementing csp.backtracking_search():
 # {'WA': 'red', 'NT': 'green', 'Q': 'red', 'NSW': 'green', 'V': 'red', 'SA': 'blue', 'T': 'red'}
+# Number of colorings: 18
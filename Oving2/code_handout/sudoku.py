@@ -1,8 +1,28 @@
 # Sudoku problems.
 # The CSP.ac_3() and CSP.backtrack() methods need to be implemented
 
-import time
-from csp import CSP, alldiff, backtracking_search_with_counts
+import os
+from math import isqrt
+from csp import CSP, CompiledCSP, alldiff
+
+# The size of the standard grid. Grids of any size n^2 x n^2 (16 x 16, 25 x 25, ...) are
+# supported, their size is taken from the grid itself.
+width = 9
+box_width = 3
+
+# The compiled constraint graph shared by every puzzle of a size, see sudoku_model()
+_models: dict[int, CompiledCSP] = {}
+
+
+def variable_name(row: int, col: int, width: int = width) -> str:
+    """Returns the variable of the cell at the 0-based row and col.
+
+    Up to 9 x 9 this is X{row}{col} with 1-based indices. Larger grids separate the indices
+    (X{row}_{col}), since X111 could be both row 1, column 11 and row 11, column 1.
+    """
+    if width <= 9:
+        return f'X{row+1}{col+1}'
+    return f'X{row+1}_{col+1}'
 
 
 def print_solution(solution):
@@ -10,79 +30,190 @@ def print_solution(solution):
     Convert the representation of a Sudoku solution, as returned from
     the method CSP.backtracking_search(), into a Sudoku board.
     """
-    for row in range(width):
-        for col in range(width):
-            print(solution[f'X{row+1}{col+1}'], end=" ")
-            if col == 2 or col == 5:
+    size = isqrt(len(solution))
+    box = isqrt(size)
+    cell_width = len(str(size))
+    for row in range(size):
+        for col in range(size):
+            print(f'{solution[variable_name(row, col, size)]:>{cell_width}}', end=" ")
+            if col % box == box - 1 and col != size - 1:
                 print('|', end=" ")
         print("")
-        if row == 2 or row == 5:
-            print('------+-------+------')
+        if row % box == box - 1 and row != size - 1:
+            print('+'.join('-' * ((cell_width + 1) * box + (i not in (0, box - 1))) for i in range(box)))
 
 
-# Choose Sudoku problem
-grid = open('sudoku_easy.txt').read().split()
+def parse_grid(text: str) -> list[list[str]]:
+    """Parses a Sudoku grid of n^2 lines of n^2 cells, with 0 or . for empty cells.
 
-width = 9
-box_width = 3
+    The cells of a line are either single characters written together (123456789) or numbers
+    separated by whitespace (10 0 3 16 ...), which grids larger than 9 x 9 need.
 
-domains = {}
-for row in range(width):
+    Raises
+    ------
+    ValueError
+        If the grid is not square with a square size, or a cell is not a number in range
+    """
+    rows = []
+    for line in text.splitlines():
+        cells = line.split()
+        if not cells:
+            continue
+        if len(cells) == 1:
+            cells = list(cells[0])
+        rows.append(['0' if cell == '.' else cell for cell in cells])
+    size = len(rows)
+    if size == 0 or isqrt(size) ** 2 != size:
+        raise ValueError(f'A grid needs n^2 rows for some n, got {size}')
+    for number, row in enumerate(rows, 1):
+        if len(row) != size:
+            raise ValueError(f'Row {number}: expected {size} cells, got {len(row)}')
+        for cell in row:
+            if not cell.isdigit() or int(cell) > size:
+                raise ValueError(f'Row {number}: {cell!r} is not a number from 0 to {size}')
+    return rows
+
+
+def read_grid(filename: str) -> list[list[str]]:
+    """Reads a Sudoku grid in the format of parse_grid(), such as 9 lines of 9 digits."""
+    with open(filename) as file:
+        return parse_grid(file.read())
+
+
+def sudoku_alldiffs(width: int = width) -> list[list[str]]:
+    """Returns the rows, columns and boxes, which each are one n-ary AllDifferent constraint."""
+    box_width = isqrt(width)
+    alldiffs = []
+    for row in range(width):
+        alldiffs.append([variable_name(row, col, width) for col in range(width)])
     for col in range(width):
-        if grid[row][col] == '0':
-            domains[f'X{row+1}{col+1}'] = set(range(1, 10))
-        else:
-            domains[f'X{row+1}{col+1}'] = {int(grid[row][col])}
-
-edges = []
-for row in range(width):
-    edges += alldiff([f'X{row+1}{col+1}' for col in range(width)])
-for col in range(width):
-    edges += alldiff([f'X{row+1}{col+1}' for row in range(width)])
-for box_row in range(box_width):
-    for box_col in range(box_width):
-        cells = []
-        edges += alldiff(
-            [
-                f'X{row+1}{col+1}' for row in range(box_row * box_width, (box_row + 1) * box_width)
-                for col in range(box_col * box_width, (box_col + 1) * box_width)
-            ]
-        )
+        alldiffs.append([variable_name(row, col, width) for row in range(width)])
+    for box_row in range(box_width):
+        for box_col in range(box_width):
+            alldiffs.append(
+                [
+                    variable_name(row, col, width) for row in range(box_row * box_width, (box_row + 1) * box_width)
+                    for col in range(box_col * box_width, (box_col + 1) * box_width)
+                ]
+            )
+    return alldiffs
+
+
+def grid_domains(grid: list[list[str]]) -> dict[str, set[int]]:
+    width = len(grid)
+    domains = {}
+    for row in range(width):
+        for col in range(width):
+            if grid[row][col] == '0':
+                domains[variable_name(row, col, width)] = set(range(1, width + 1))
+            else:
+                domains[variable_name(row, col, width)] = {int(grid[row][col])}
+    return domains
+
+
+def sudoku_model(cache_file: str | None = None, width: int = width) -> CompiledCSP:
+    """Returns the compiled constraint graph of width x width Sudoku, building it only once per process.
+
+    If cache_file is given, the model is loaded from it when it exists and is for a grid of this
+    width, and saved to it otherwise.
+    """
+    if width not in _models:
+        model = None
+        if cache_file is not None and os.path.exists(cache_file):
+            model = CompiledCSP.load(cache_file)
+            if len(model.variables) != width * width:
+                model = None
+        if model is None:
+            variables = [variable_name(row, col, width) for row in range(width) for col in range(width)]
+            model = CSP(
+                variables=variables,
+                domains={variable: set(range(1, width + 1)) for variable in variables},
+                edges=[],
+                alldiffs=sudoku_alldiffs(width),
+            ).compile()
+            if cache_file is not None:
+                model.save(cache_file)
+        _models[width] = model
+    return _models[width]
+
+
+def build_csp(grid: list[list[str]], domains: dict[str, set[int]] | None = None) -> CSP:
+    """Builds the CSP for a Sudoku grid as returned by read_grid().
+
+    Candidate domains already narrowed down elsewhere can be passed instead of the grid's.
+    """
+    return sudoku_model(width=len(grid)).instantiate(domains if domains is not None else grid_domains(grid), bitset=True)
+
 
-csp = CSP(
-    variables=[f'X{row+1}{col+1}' for row in range(width) for col in range(width)],
-    domains=domains,
-    edges=edges,
-)
-
-# Run AC-3 algorithm and measure runtime
-ac3_start_time = time.time()
-ac3_result = csp.ac_3()
-ac3_end_time = time.time()
-ac3_runtime = ac3_end_time - ac3_start_time
-
-print(csp.ac_3())
-if ac3_result:
-    print("Domains after AC-3:")
-    for var in sorted(csp.variables):
-        print(f"{var}: {csp.domains[var]}")
-
-    backtrack_calls = 0
-    backtrack_failures = 0
-
-    solution, backtrack_calls, backtrack_failures, backtracking_runtime = backtracking_search_with_counts(csp)
-    total_runtime = ac3_runtime + backtracking_runtime
-
-    print(f"Backtrack calls: {backtrack_calls}")
-    print(f"Backtrack failures: {backtrack_failures}")
-    print(f"Backtracking runtime: {backtracking_runtime:.6f} seconds")
-    print(f"AC-3 runtime: {ac3_runtime:.6f} seconds")
-    print(f"Total runtime: {total_runtime:.6f} seconds")
-
-    print_solution(csp.backtracking_search())
-else:
-    print("No solution found during AC-3 preprocessing.")
-print_solution(csp.backtracking_search())
+def solve(grid: list[list[str]]) -> tuple[dict | None, dict]:
+    """Solves a Sudoku grid with AC-3 followed by MAC search with MRV and LCV.
+
+    Returns
+    -------
+    tuple[dict | None, dict]
+        The solution, or None if the grid has none, and statistics about the solve
+    """
+    return solve_csp(build_csp(grid))
+
+
+def solve_csp(csp: CSP, histograms: bool = False) -> tuple[dict | None, dict]:
+    """Like solve(), for a CSP that has already been built.
+
+    The statistics are those of csp.stats (see csp.SolverStats), which is enabled for the solve,
+    under the names used by earlier versions of this function.
+    """
+    stats = csp.enable_stats(histograms)
+    ac3_result = csp.ac_3()
+    solution = None
+    if ac3_result:
+        # Without recursion, since large grids have more cells than the recursion limit allows
+        solution = csp.iterative_search(inference='mac', variable_ordering='mrv', value_ordering='lcv')
+    return solution, {
+        'ac3_result': ac3_result,
+        'backtrack_calls': stats.nodes,
+        'backtrack_failures': stats.failures,
+        'ac3_runtime': stats.phase_ns.get('ac_3', 0) / 1e9,
+        'backtracking_runtime': stats.phase_ns.get('search', 0) / 1e9,
+        **stats.as_dict(),
+    }
+
+
+if __name__ == '__main__':
+    # Choose Sudoku problem
+    grid = read_grid('sudoku_easy.txt')
+
+    # Compare plain AC-3 with AC-3rm (residual supports) on the pairwise value-pair table encoding
+    different = {(value1, value2) for value1 in range(1, 10) for value2 in range(1, 10) if value1 != value2}
+    for strategy in ('ac3', 'ac3rm'):
+        table_csp = CSP(
+            variables=[f'X{row+1}{col+1}' for row in range(width) for col in range(width)],
+            domains=grid_domains(grid),
+            edges=[],
+        )
+        for group in sudoku_alldiffs():
+            for variable1, variable2 in alldiff(group):
+                table_csp.add_constraint(variable1, variable2, different)
+        table_stats = table_csp.enable_stats()
+        table_csp.ac_3(strategy)
+        print(f"{strategy} constraint checks: {table_stats.constraint_checks}")
+
+    solution, stats = solve(grid)
+
+    print(stats['ac3_result'])
+    if stats['ac3_result']:
+        total_runtime = stats['ac3_runtime'] + stats['backtracking_runtime']
+
+        print(f"Backtrack calls: {stats['backtrack_calls']}")
+        print(f"Backtrack failures: {stats['backtrack_failures']}")
+        print(f"Backtracking runtime: {stats['backtracking_runtime']:.6f} seconds")
+        print(f"AC-3 runtime: {stats['ac3_runtime']:.6f} seconds")
+        print(f"Total runtime: {total_runtime:.6f} seconds")
+        print(f"AllDifferent filterings: {stats['alldiff_filters']}, domain removals: {stats['domain_removals']}")
+
+    if solution is not None:
+        print_solution(solution)
+    else:
+        print("No solution found.")
 
 # Expected output after implementing csp.ac_3() and csp.backtracking_search():
 # True
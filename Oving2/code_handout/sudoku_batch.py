@@ -0,0 +1,148 @@
+# Batch Sudoku solving.
+#
+# Streams puzzles from a file (or stdin), solves them across a process pool in chunks and writes
+# one tab-separated line per puzzle, in input order:
+#
+#     index  status  solution  backtrack_calls  backtrack_failures  microseconds
+#
+# status is 'solved' or 'unsolvable', and solution is the 81 digit solved grid ('-' if none).
+# Puzzles can be given as 9 lines of 9 digits (as in sudoku_easy.txt) or as one line of 81
+# characters, with 0 or . for empty cells. Blank lines and lines starting with # are skipped.
+#
+# Example: python sudoku_batch.py puzzles.txt -o solutions.tsv -j 8
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+from sudoku import solve, sudoku_model, width
+
+
+def read_puzzles(lines: Iterable[str]) -> Iterator[list[str]]:
+    """Yields the puzzles in lines one at a time, as grids in the format of sudoku.read_grid().
+
+    Raises
+    ------
+    ValueError
+        If a line is neither a 9 character grid row nor an 81 character puzzle
+    """
+    rows: list[str] = []
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        line = line.replace('.', '0')
+        if not line.isdigit() or len(line) not in (width, width * width) or (rows and len(line) != width):
+            raise ValueError(f'Line {line_number}: expected {width} or {width * width} digits, got {line!r}')
+        if len(line) == width * width:
+            yield [line[row * width:(row + 1) * width] for row in range(width)]
+            continue
+        rows.append(line)
+        if len(rows) == width:
+            yield rows
+            rows = []
+    if rows:
+        raise ValueError(f'Incomplete puzzle at end of input ({len(rows)} of {width} rows)')
+
+
+def solve_chunk(chunk: list[list[str]]) -> list[str]:
+    """Solves a chunk of puzzles and returns their output lines, without the index column."""
+    lines = []
+    for grid in chunk:
+        start_time = time.perf_counter()
+        solution, stats = solve(grid)
+        microseconds = round((time.perf_counter() - start_time) * 1e6)
+        if solution is None:
+            status, cells = 'unsolvable', '-'
+        else:
+            status = 'solved'
+            cells = ''.join(str(solution[f'X{row+1}{col+1}']) for row in range(width) for col in range(width))
+        lines.append(f"{status}\t{cells}\t{stats['backtrack_calls']}\t{stats['backtrack_failures']}\t{microseconds}")
+    return lines
+
+
+def solve_stream(
+    puzzles: Iterable[list[str]],
+    output: TextIO,
+    workers: int | None = None,
+    chunk_size: int = 256,
+    max_pending: int | None = None,
+    model_cache: str | None = None,
+) -> int:
+    """Solves a stream of puzzles in parallel and writes the results to output in input order.
+
+    At most max_pending chunks are submitted and not yet written at any time, so memory use does
+    not grow with the size of the input.
+
+    Parameters
+    ----------
+    puzzles : Iterable[list[str]]
+        The puzzles, for example from read_puzzles()
+    output : TextIO
+        Where to write the result lines
+    workers : int | None
+        The number of worker processes, None for one per CPU
+    chunk_size : int
+        The number of puzzles sent to a worker at a time
+    max_pending : int | None
+        The number of chunks in flight, by default twice the number of workers
+    model_cache : str | None
+        File the workers load the compiled Sudoku model from, see sudoku.sudoku_model()
+
+    Returns
+    -------
+    int
+        The number of puzzles solved or found unsolvable
+    """
+    puzzles = iter(puzzles)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    count = 0
+    if model_cache is not None:
+        # Write the cache once up front instead of racing to create it in every worker
+        sudoku_model(model_cache)
+    with ProcessPoolExecutor(max_workers=workers, initializer=sudoku_model, initargs=(model_cache,)) as executor:
+        pending = deque()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_pending:
+                chunk = list(islice(puzzles, chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending.append(executor.submit(solve_chunk, chunk))
+            if pending:
+                for line in pending.popleft().result():
+                    output.write(f'{count}\t{line}\n')
+                    count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a file of Sudoku puzzles in parallel.')
+    parser.add_argument('input', help="puzzle file, or - for stdin")
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=256, help='puzzles per task (default: 256)')
+    parser.add_argument('--model-cache', help='file to load (or create) the compiled Sudoku model from')
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    output_file = sys.stdout if args.output is None else open(args.output, 'w')
+    start_time = time.perf_counter()
+    try:
+        solved = solve_stream(
+            read_puzzles(input_file), output_file, args.workers, args.chunk_size, model_cache=args.model_cache
+        )
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    runtime = time.perf_counter() - start_time
+    print(f'{solved} puzzles in {runtime:.2f} seconds ({solved / max(runtime, 1e-9):.0f} puzzles/second)', file=sys.stderr)
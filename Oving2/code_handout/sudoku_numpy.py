@@ -0,0 +1,182 @@
+# Vectorized Sudoku propagation over many grids at once.
+#
+# Holds N grids as an N x 81 x 9 boolean candidate tensor and applies naked single elimination
+# and hidden single placement to all of them with NumPy array operations. Grids that are still
+# unsolved when propagation stalls fall back to the CSP search in sudoku.py.
+#
+# Example: python sudoku_numpy.py puzzles.txt -o solutions.tsv --batch-size 10000
+#
+# Input is read with sudoku_batch.read_puzzles(), output has one tab-separated line per puzzle:
+#
+#     index  status  solution  method
+#
+# where method is 'propagation' if the grid was settled without search and 'search' otherwise.
+#
+# Needs NumPy (pip install numpy), which the rest of the CSP code does not depend on.
+
+import argparse
+import sys
+import time
+from itertools import islice
+from typing import Iterable, TextIO
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise ImportError('sudoku_numpy.py needs NumPy, install it with: pip install numpy') from error
+
+from sudoku import box_width, build_csp, solve_csp, width
+from sudoku_batch import read_puzzles
+
+# Every unit (rows, columns, boxes) as a row of cell indices, and for each cell the mask of its peers
+UNITS = np.array(
+    [[row * width + col for col in range(width)] for row in range(width)]
+    + [[row * width + col for row in range(width)] for col in range(width)]
+    + [
+        [row * width + col
+         for row in range(box_row * box_width, (box_row + 1) * box_width)
+         for col in range(box_col * box_width, (box_col + 1) * box_width)]
+        for box_row in range(box_width) for box_col in range(box_width)
+    ]
+)
+PEERS = np.zeros((width * width, width * width), dtype=bool)
+for unit in UNITS:
+    PEERS[np.ix_(unit, unit)] = True
+np.fill_diagonal(PEERS, False)
+PEERS_FLOAT = PEERS.astype(np.float32)
+
+# UNIT_MEMBERSHIP[u, c] is True if cell c is in unit u
+UNIT_MEMBERSHIP = np.zeros((len(UNITS), width * width), dtype=bool)
+for u, unit in enumerate(UNITS):
+    UNIT_MEMBERSHIP[u, unit] = True
+UNIT_MEMBERSHIP_FLOAT = UNIT_MEMBERSHIP.astype(np.float32)
+
+
+def grids_to_candidates(grids: list[list[str]]) -> np.ndarray:
+    """Converts grids in the format of sudoku.read_grid() to an N x 81 x 9 candidate tensor."""
+    digits = np.frombuffer(''.join(''.join(grid) for grid in grids).encode(), dtype=np.uint8) - ord('0')
+    digits = digits.reshape(len(grids), width * width)
+    candidates = np.ones((len(grids), width * width, width), dtype=bool)
+    given = digits > 0
+    candidates[given] = np.arange(1, width + 1) == digits[given][:, None]
+    return candidates
+
+
+def propagate(candidates: np.ndarray) -> np.ndarray:
+    """Applies naked and hidden singles to every grid until none of them change.
+
+    Parameters
+    ----------
+    candidates : np.ndarray
+        N x 81 x 9 boolean candidates, updated in place
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array of length N, True for grids found to be contradictory
+    """
+    dead = np.zeros(len(candidates), dtype=bool)
+    active = np.arange(len(candidates))
+    while len(active):
+        grids = candidates[active]
+        before = grids.copy()
+
+        # Naked singles: a cell's only candidate is removed from all of its peers
+        counts = grids.sum(axis=2)
+        singles = (grids & (counts == 1)[:, :, None]).astype(np.float32)
+        taken = np.einsum('pc,ncd->npd', PEERS_FLOAT, singles) > 0
+        grids &= ~taken
+
+        # Hidden singles: a digit with a single place left in a unit goes there
+        places = np.einsum('uc,ncd->nud', UNIT_MEMBERSHIP_FLOAT, grids.astype(np.float32))
+        only = (places == 1).astype(np.float32)
+        hidden = (np.einsum('uc,nud->ncd', UNIT_MEMBERSHIP_FLOAT, only) > 0) & grids
+        has_hidden = hidden.any(axis=2)
+        grids[has_hidden] = hidden[has_hidden]
+
+        # Contradictions: a cell without candidates, or a digit without a place in some unit
+        contradiction = (grids.sum(axis=2) == 0).any(axis=1) | (places == 0).any(axis=(1, 2))
+        candidates[active] = grids
+        dead[active[contradiction]] = True
+
+        changed = (grids != before).any(axis=(1, 2)) & ~contradiction
+        active = active[changed]
+    return dead
+
+
+def solve_batch(grids: list[list[str]]) -> list[tuple[str, str | None]]:
+    """Solves a batch of grids, propagating them together and searching only where needed.
+
+    Returns
+    -------
+    list[tuple[str, str | None]]
+        For every grid the method used ('propagation' or 'search') and the 81 digit solution,
+        or None if the grid has no solution
+    """
+    candidates = grids_to_candidates(grids)
+    dead = propagate(candidates)
+    solved = (candidates.sum(axis=2) == 1).all(axis=1) & ~dead
+    digits = candidates.argmax(axis=2) + 1
+
+    results: list[tuple[str, str | None]] = []
+    for i, grid in enumerate(grids):
+        if dead[i]:
+            results.append(('propagation', None))
+        elif solved[i]:
+            results.append(('propagation', ''.join(map(str, digits[i]))))
+        else:
+            # Fall back to the CSP search, starting from the propagated candidates
+            domains = {
+                f'X{cell // width + 1}{cell % width + 1}': {int(d) + 1 for d in np.flatnonzero(candidates[i, cell])}
+                for cell in range(width * width)
+            }
+            solution, _ = solve_csp(build_csp(grid, domains))
+            if solution is None:
+                results.append(('search', None))
+            else:
+                results.append((
+                    'search',
+                    ''.join(str(solution[f'X{row+1}{col+1}']) for row in range(width) for col in range(width)),
+                ))
+    return results
+
+
+def solve_stream(puzzles: Iterable[list[str]], output: TextIO, batch_size: int = 10000) -> int:
+    """Solves a stream of puzzles batch_size at a time and writes the results to output in order.
+
+    Returns
+    -------
+    int
+        The number of puzzles processed
+    """
+    puzzles = iter(puzzles)
+    count = 0
+    while True:
+        batch = list(islice(puzzles, batch_size))
+        if not batch:
+            return count
+        for method, solution in solve_batch(batch):
+            status = 'unsolvable' if solution is None else 'solved'
+            output.write(f'{count}\t{status}\t{solution or "-"}\t{method}\n')
+            count += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a file of Sudoku puzzles with vectorized propagation.')
+    parser.add_argument('input', help="puzzle file, or - for stdin")
+    parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    parser.add_argument('--batch-size', type=int, default=10000, help='grids propagated together (default: 10000)')
+    args = parser.parse_args()
+
+    input_file = sys.stdin if args.input == '-' else open(args.input)
+    output_file = sys.stdout if args.output is None else open(args.output, 'w')
+    start_time = time.perf_counter()
+    try:
+        processed = solve_stream(read_puzzles(input_file), output_file, args.batch_size)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    runtime = time.perf_counter() - start_time
+    print(f'{processed} puzzles in {runtime:.2f} seconds ({processed / max(runtime, 1e-9):.0f} puzzles/second)', file=sys.stderr)
@@ -1,3 +1,5 @@
+from transposition_table import EXACT, TranspositionTable
+
 State = tuple[int, list[str | int]]  # Tuple of player (whose turn it is),
                                      # and the buckets (as str)
                                      # or the number in a bucket
@@ -26,6 +28,11 @@ class Game:
         assert type(action) is int
         return (self.to_move(state) + 1) % 2, [action]
 
+    def key(self, state: State) -> tuple:
+        """Returns a hashable key identifying the state, for transposition tables."""
+        player, buckets = state
+        return player, tuple(buckets)
+
     def is_terminal(self, state: State) -> bool:
         _, actions = state
         return len(actions) == 1
@@ -43,49 +50,70 @@ class Game:
         else:
             print(f'it is P{self.to_move(state)+1}\'s turn')
             
-def minimax_search(game, state):
+def minimax_search(game, state, table=None):
+    # table is an optional TranspositionTable shared between searches
     player = game.to_move(state)
-    value, move = max_value(game, state, player)
+    value, move = max_value(game, state, player, table)
     return move
 
 
-def max_value(game, state, player):
+def max_value(game, state, player, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    # Values are from player's point of view, so the key includes player
+    if table is not None:
+        key = (game.key(state), player)
+        entry = table.lookup(key)
+        if entry is not None:
+            return entry[0], entry[1]
+
     v = -float('inf')
     best_action = None
     for action in game.actions(state):
-        min_val, _ = min_value(game, game.result(state, action), player)
+        min_val, _ = min_value(game, game.result(state, action), player, table)
         if min_val > v:
             v = min_val
             best_action = action
+    if table is not None:
+        table.store(key, v, best_action, EXACT)
     return v, best_action
 
 
-def min_value(game, state, player):
+def min_value(game, state, player, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    # Values are from player's point of view, so the key includes player
+    if table is not None:
+        key = (game.key(state), player)
+        entry = table.lookup(key)
+        if entry is not None:
+            return entry[0], entry[1]
+
     v = float('inf')
     best_action = None
     for action in game.actions(state):
-        max_val, _ = max_value(game, game.result(state, action), player)
+        max_val, _ = max_value(game, game.result(state, action), player, table)
         if max_val < v:
             v = max_val
             best_action = action
+    if table is not None:
+        table.store(key, v, best_action, EXACT)
     return v, best_action
 
 
 # Play the game
 game = Game()
+table = TranspositionTable()
 state = game.initial_state()
 game.print(state)
 
 while not game.is_terminal(state):
     player = game.to_move(state)
-    action = minimax_search(game, state)  # The player whose turn it is uses the Minimax algorithm
+    action = minimax_search(game, state, table)  # The player whose turn it is uses the Minimax algorithm
     print(f'P{player + 1}\'s action: {action}')
     assert action is not None
     state = game.result(state, action)
     game.print(state)
+print(table.report())
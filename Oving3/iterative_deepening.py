@@ -0,0 +1,130 @@
+import time
+from itertools import count
+from typing import Any, Callable
+
+# evaluate(game, state, player) estimates the value of a non-terminal state for player, between
+# the game's loss and win utilities
+Evaluation = Callable[[Any, Any, int], float]
+
+
+class Timeout(Exception):
+    """Raised inside a search when the deadline has passed."""
+
+
+def zero_evaluation(game, state, player) -> float:
+    return 0
+
+
+class IterativeDeepeningSearch:
+    """Depth-limited alpha-beta search run with depth 1, 2, 3, ... until a hard deadline.
+
+    Works on any two-player zero-sum game with the Game methods to_move(), actions(), result(),
+    is_terminal(), utility() and key(). States at the depth limit are scored with evaluate.
+
+    Moves are tried in the order:
+    1. the principal variation (PV) move, the best move found for the state by the previous,
+       shallower iteration
+    2. the killer moves of the ply, the last two moves that caused a cutoff at the same depth
+       in another branch
+    3. the rest by their history score, which grows by depth^2 every time a move causes a cutoff
+
+    so each iteration mostly searches the best moves of the last one first and cuts off early.
+
+    When the deadline passes during an iteration, the iteration is abandoned and the best move
+    of the last completed one is returned.
+    """
+
+    def __init__(self, game, evaluate: Evaluation = zero_evaluation, max_depth: int | None = None):
+        self.game = game
+        self.evaluate = evaluate
+        self.max_depth = max_depth
+        self.pv: dict[Any, Any] = {}
+        self.killers: list[list[Any]] = []
+        self.history: dict[Any, int] = {}
+        self.nodes = 0
+        self.completed_depth = 0
+        self.value = 0.0
+        self.deadline = float('inf')
+        self._depth_limited = False
+
+    def search(self, state, time_limit: float) -> Any:
+        """Returns the best move found within time_limit seconds, or None if there is no move.
+
+        The search stops early when an iteration was not cut short by the depth limit anywhere,
+        since deeper iterations would then find the same result.
+        """
+        self.deadline = time.perf_counter() + time_limit
+        self.pv = {}
+        self.killers = []
+        self.history = {}
+        self.nodes = 0
+        self.completed_depth = 0
+        actions = self.game.actions(state)
+        if not actions:
+            return None
+        best_action = actions[0]
+        for depth in count(1):
+            self._depth_limited = False
+            try:
+                value, action = self.negamax(state, depth, 0, -float('inf'), float('inf'))
+            except Timeout:
+                break
+            best_action, self.value, self.completed_depth = action, value, depth
+            if not self._depth_limited or (self.max_depth is not None and depth >= self.max_depth):
+                break
+        return best_action
+
+    def negamax(self, state, depth: int, ply: int, alpha: float, beta: float) -> tuple[float, Any]:
+        """Returns the value of state for the player to move and the best action."""
+        self.nodes += 1
+        if time.perf_counter() >= self.deadline:
+            raise Timeout
+        game = self.game
+        player = game.to_move(state)
+        if game.is_terminal(state):
+            return game.utility(state, player), None
+        if depth == 0:
+            self._depth_limited = True
+            return self.evaluate(game, state, player), None
+
+        key = game.key(state)
+        v = -float('inf')
+        best_action = None
+        for action in self.ordered_actions(state, key, ply):
+            value = -self.negamax(game.result(state, action), depth - 1, ply + 1, -beta, -alpha)[0]
+            if value > v:
+                v = value
+                best_action = action
+            alpha = max(alpha, v)
+            if v >= beta:
+                self.record_cutoff(action, depth, ply)
+                break
+        self.pv[key] = best_action
+        return v, best_action
+
+    def ordered_actions(self, state, key, ply: int) -> list:
+        actions = list(self.game.actions(state))
+        history = self.history
+        actions.sort(key=lambda action: -history.get(action, 0))
+        first = [self.pv.get(key)]
+        if ply < len(self.killers):
+            first.extend(self.killers[ply])
+        for action in reversed(first):
+            if action is not None and action in actions:
+                actions.remove(action)
+                actions.insert(0, action)
+        return actions
+
+    def record_cutoff(self, action, depth: int, ply: int):
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        self.history[action] = self.history.get(action, 0) + depth * depth
+
+
+def iterative_deepening_search(game, state, time_limit: float, evaluate: Evaluation = zero_evaluation):
+    """Returns the move iterative deepening alpha-beta finds for state within time_limit seconds."""
+    return IterativeDeepeningSearch(game, evaluate).search(state, time_limit)
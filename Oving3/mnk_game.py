@@ -0,0 +1,180 @@
+import time
+from typing import NamedTuple
+
+from iterative_deepening import IterativeDeepeningSearch
+
+Action = tuple[int, int]  # Where to place the player's stone (row, col)
+
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class State(NamedTuple):
+    player: int  # Whose turn it is
+    board: tuple[int | None, ...]  # The m x n cells row by row, None for empty
+    moves: int  # The number of stones on the board
+    winner: int | None  # The player who got k in a row with the last move, if any
+    candidates: frozenset[Action]  # Empty cells close to some stone, see Game.actions()
+    counts: tuple[int, ...]  # The stones of each player in every window, see Game.windows
+    threats: tuple[int, int]  # Each player's window score, see evaluate()
+
+
+class Game:
+    """The m,n,k game: players take turns placing stones on an m x n board, and the first to get
+    k in a row horizontally, vertically or diagonally wins. 15,15,5 is five in a row (gomoku).
+
+    Only the lines through the last stone can be new wins, so result() checks those and stores
+    the winner in the state, and only empty cells within radius of a stone are offered as moves,
+    since moves far from every stone hardly ever matter. Likewise the window scores used by
+    evaluate() are only updated for the windows through the last stone.
+    """
+
+    def __init__(self, m: int = 15, n: int = 15, k: int = 5, radius: int = 2):
+        self.m = m
+        self.n = n
+        self.k = k
+        self.radius = radius
+        # Every k cells in a row, as board indices, and the windows each cell is part of
+        self.windows = [
+            tuple((row + i * dr) * n + col + i * dc for i in range(k))
+            for row in range(m) for col in range(n) for dr, dc in DIRECTIONS
+            if 0 <= row + (k - 1) * dr < m and 0 <= col + (k - 1) * dc < n
+        ]
+        self.cell_windows: list[list[int]] = [[] for _ in range(m * n)]
+        for w, window in enumerate(self.windows):
+            for index in window:
+                self.cell_windows[index].append(w)
+
+    def initial_state(self) -> State:
+        return State(
+            0, (None,) * (self.m * self.n), 0, None, frozenset({(self.m // 2, self.n // 2)}),
+            (0,) * len(self.windows), (0, 0),
+        )
+
+    def to_move(self, state: State) -> int:
+        return state.player
+
+    def actions(self, state: State) -> list[Action]:
+        if self.is_terminal(state):
+            return []
+        return sorted(state.candidates)
+
+    def result(self, state: State, action: Action) -> State:
+        row, col = action
+        board = list(state.board)
+        board[row * self.n + col] = state.player
+        winner = state.player if self.completes_line(board, row, col) else None
+        candidates = set(state.candidates)
+        candidates.discard(action)
+        for r in range(max(0, row - self.radius), min(self.m, row + self.radius + 1)):
+            for c in range(max(0, col - self.radius), min(self.n, col + self.radius + 1)):
+                if board[r * self.n + c] is None:
+                    candidates.add((r, c))
+
+        # A window's count is stones0 + (k + 1) * stones1. A window only one player has stones
+        # in adds 10^stones to that player's threat score.
+        counts = list(state.counts)
+        threats = list(state.threats)
+        base = self.k + 1
+        for w in self.cell_windows[row * self.n + col]:
+            stones0, stones1 = counts[w] % base, counts[w] // base
+            if not stones1 and stones0:
+                threats[0] -= 10 ** stones0
+            elif not stones0 and stones1:
+                threats[1] -= 10 ** stones1
+            if state.player == 0:
+                stones0 += 1
+            else:
+                stones1 += 1
+            counts[w] = stones0 + base * stones1
+            if not stones1:
+                threats[0] += 10 ** stones0
+            elif not stones0:
+                threats[1] += 10 ** stones1
+        return State(
+            1 - state.player, tuple(board), state.moves + 1, winner, frozenset(candidates),
+            tuple(counts), (threats[0], threats[1]),
+        )
+
+    def completes_line(self, board: list[int | None], row: int, col: int) -> bool:
+        """Returns whether the stone at row, col is part of k or more in a row."""
+        player = board[row * self.n + col]
+        for dr, dc in DIRECTIONS:
+            length = 1
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < self.m and 0 <= c < self.n and board[r * self.n + c] == player:
+                    length += 1
+                    r, c = r + sign * dr, c + sign * dc
+            if length >= self.k:
+                return True
+        return False
+
+    def key(self, state: State) -> tuple:
+        """Returns a hashable key identifying the state, for transposition tables."""
+        return state.player, state.board
+
+    def is_winner(self, state: State, player: int) -> bool:
+        return state.winner == player
+
+    def is_terminal(self, state: State) -> bool:
+        return state.winner is not None or state.moves == self.m * self.n
+
+    def utility(self, state: State, player: int) -> float:
+        assert self.is_terminal(state)
+        if state.winner is None:
+            return 0
+        return 1 if state.winner == player else -1
+
+    def print(self, state: State):
+        print()
+        print('   ' + ' '.join(f'{col:>2}' for col in range(self.n)))
+        for row in range(self.m):
+            cells = [
+                ' .' if state.board[row * self.n + col] is None else ' x' if state.board[row * self.n + col] == 0 else ' o'
+                for col in range(self.n)
+            ]
+            print(f'{row:>2} ' + ' '.join(cells))
+        print()
+        if self.is_terminal(state):
+            if self.utility(state, 0) > 0:
+                print('P1 won')
+            elif self.utility(state, 1) > 0:
+                print('P2 won')
+            else:
+                print('The game is a draw')
+        else:
+            print(f'It is P{self.to_move(state)+1}\'s turn to move')
+
+
+def evaluate(game: Game, state: State, player: int) -> float:
+    """Scores a state for player by the windows of k cells that only one player has stones in.
+
+    A window with s of a player's stones counts 10^s for that player, so an open four outweighs
+    many twos, and the difference is squashed to stay strictly between -1 and 1 (loss and win).
+    The player to move gets their windows counted double, as they get to extend them first.
+    The window sums are kept up to date by Game.result(), so this takes constant time.
+    """
+    own, opponent = state.threats[player], state.threats[1 - player]
+    if state.player == player:
+        own *= 2
+    else:
+        opponent *= 2
+    score = own - opponent
+    return score / (abs(score) + 10 ** (game.k - 1))
+
+
+if __name__ == '__main__':
+    game = Game()
+    state = game.initial_state()
+    searcher = IterativeDeepeningSearch(game, evaluate)
+    while not game.is_terminal(state):
+        player = game.to_move(state)
+        start_time = time.perf_counter()
+        action = searcher.search(state, time_limit=1.0)
+        print(
+            f'P{player + 1}\'s action: {action} (depth {searcher.completed_depth}, '
+            f'{searcher.nodes} nodes, {time.perf_counter() - start_time:.2f} seconds)'
+        )
+        assert action is not None
+        state = game.result(state, action)
+    game.print(state)
@@ -1,6 +1,9 @@
 from copy import deepcopy
 import time
 
+from iterative_deepening import IterativeDeepeningSearch
+from transposition_table import EXACT, LOWER, TranspositionTable, bound_type
+
 State = tuple[int, list[list[int | None]]]  # Tuple of player (whose turn it is), and board
 Action = tuple[int, int]  # Where to place the player's piece
 
@@ -28,6 +31,11 @@ class Game:
         next_board[row][col] = self.to_move(state)
         return (self.to_move(state) + 1) % 2, next_board
 
+    def key(self, state: State) -> tuple:
+        """Returns a hashable key identifying the state, for transposition tables."""
+        player, board = state
+        return player, tuple(tuple(row) for row in board)
+
     def is_winner(self, state: State, player: int) -> bool:
         _, board = state
         for row in range(3):
@@ -78,53 +86,107 @@ class Game:
 
 
 
-def minimax_search(game, state):
+def minimax_search(game, state, table=None):
     # YOUR CODE HERE
+    # table is an optional TranspositionTable shared between searches
     player = game.to_move(state)
-    value, move = max_value(game, state, player)
+    value, move = max_value(game, state, player, table)
     return move
 
-def max_value(game, state, player):
+def max_value(game, state, player, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    # Values are from player's point of view, so the key includes player
+    if table is not None:
+        key = (game.key(state), player)
+        entry = table.lookup(key)
+        if entry is not None:
+            return entry[0], entry[1]
+
     v = -float('inf')
     best_action = None
     for action in game.actions(state):
-        min_val, _ = min_value(game, game.result(state, action), player)
+        min_val, _ = min_value(game, game.result(state, action), player, table)
         if min_val > v:
             v = min_val
             best_action = action
+    if table is not None:
+        table.store(key, v, best_action, EXACT)
     return v, best_action
 
-def min_value(game, state, player):
+def min_value(game, state, player, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    if table is not None:
+        key = (game.key(state), player)
+        entry = table.lookup(key)
+        if entry is not None:
+            return entry[0], entry[1]
+
     v = float('inf')
     best_action = None
     for action in game.actions(state):
-        max_val, _ = max_value(game, game.result(state, action), player)
+        max_val, _ = max_value(game, game.result(state, action), player, table)
         if max_val < v:
             v = max_val
             best_action = action
+    if table is not None:
+        table.store(key, v, best_action, EXACT)
     return v, best_action
 
 
 # Alpha-beta code
-def alpha_beta_search(game, state):
+def alpha_beta_search(game, state, table=None):
     player = game.to_move(state)
-    value, move = max_value_alpha_beta(game, state, player, -float('inf'), float('inf'))
+    value, move = max_value_alpha_beta(game, state, player, -float('inf'), float('inf'), table)
     return move
 
-def max_value_alpha_beta(game, state, player, alpha, beta):
+def probe(table, key, alpha, beta):
+    """Looks up a state in the transposition table and narrows the window with its bound.
+
+    Returns the stored (value, move) if it settles the state, the window to search with and
+    the stored best move, which is worth trying first.
+    """
+    entry = table.lookup(key)
+    if entry is None:
+        return None, alpha, beta, None
+    value, move, bound = entry
+    if bound == EXACT:
+        return (value, move), alpha, beta, move
+    if bound == LOWER:
+        alpha = max(alpha, value)
+    else:
+        beta = min(beta, value)
+    if alpha >= beta:
+        return (value, move), alpha, beta, move
+    return None, alpha, beta, move
+
+def ordered_actions(game, state, first):
+    actions = game.actions(state)
+    if first in actions:
+        actions.remove(first)
+        actions.insert(0, first)
+    return actions
+
+def max_value_alpha_beta(game, state, player, alpha, beta, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    first = None
+    if table is not None:
+        key = (game.key(state), player)
+        settled, alpha, beta, first = probe(table, key, alpha, beta)
+        if settled is not None:
+            return settled
+        # The bound type of the result depends on the window it was searched with
+        alpha_start, beta_start = alpha, beta
+
     v = -float('inf')
     best_action = None
-    for action in game.actions(state):
-        min_val, _ = min_value_alpha_beta(game, game.result(state, action), player, alpha, beta)
+    for action in ordered_actions(game, state, first):
+        min_val, _ = min_value_alpha_beta(game, game.result(state, action), player, alpha, beta, table)
         if min_val > v:
             v = min_val
             best_action = action
@@ -135,16 +197,27 @@ def max_value_alpha_beta(game, state, player, alpha, beta):
         # The minimizing player has a guaranteed better option, so skip remaining actions
         if v >= beta:
             break
+    if table is not None:
+        table.store(key, v, best_action, bound_type(v, alpha_start, beta_start))
     return v, best_action
 
-def min_value_alpha_beta(game, state, player, alpha, beta):
+def min_value_alpha_beta(game, state, player, alpha, beta, table=None):
     if game.is_terminal(state):
         return game.utility(state, player), None
 
+    first = None
+    if table is not None:
+        key = (game.key(state), player)
+        settled, alpha, beta, first = probe(table, key, alpha, beta)
+        if settled is not None:
+            return settled
+        # The bound type of the result depends on the window it was searched with
+        alpha_start, beta_start = alpha, beta
+
     v = float('inf')
     best_action = None
-    for action in game.actions(state):
-        max_val, _ = max_value_alpha_beta(game, game.result(state, action), player, alpha, beta)
+    for action in ordered_actions(game, state, first):
+        max_val, _ = max_value_alpha_beta(game, game.result(state, action), player, alpha, beta, table)
         if max_val < v:
             v = max_val
             best_action = action
@@ -155,31 +228,330 @@ def min_value_alpha_beta(game, state, player, alpha, beta):
         #the maximizing player has found a guaranteed better path, so skip remaining actions
         if v <= alpha:
             break
+    if table is not None:
+        table.store(key, v, best_action, bound_type(v, alpha_start, beta_start))
     return v, best_action
 
 
-# Timing and comparing Minimax and Alpha-beta pruning
-game = Game()
-state = game.initial_state()
+# Evaluation for depth-limited searches, see iterative_deepening.py
+LINES = [[(row, col) for col in range(3)] for row in range(3)] + \
+    [[(row, col) for row in range(3)] for col in range(3)] + \
+    [[(i, i) for i in range(3)], [(i, 2 - i) for i in range(3)]]
 
-# Timing Minimax
-# start_time_minimax = time.time()
-# minimax_move = minimax_search(game, state)
-# minimax_time = time.time() - start_time_minimax
+def line_evaluation(game, state, player):
+    """Scores a state by the lines still open to each player, weighted by their pieces on it.
 
-# # Timing Alpha-beta pruning
-# start_time_alpha_beta = time.time()
-# alpha_beta_move = alpha_beta_search(game, state)
-# alpha_beta_time = time.time() - start_time_alpha_beta
-# print(f"Minimax move: {minimax_move}, Time taken: {minimax_time:.4f} seconds")
-# print(f"Alpha-beta move: {alpha_beta_move}, Time taken: {alpha_beta_time:.4f} seconds")
+    Stays strictly between -1 and 1, the utilities of a loss and a win.
+    """
+    _, board = state
+    score = 0
+    for line in LINES:
+        cells = [board[row][col] for row, col in line]
+        if (1 - player) not in cells:
+            score += cells.count(player) ** 2
+        if player not in cells:
+            score -= cells.count(1 - player) ** 2
+    return score / 100
 
-# Play using Alpha-beta pruning (You can change this to minimax_search to compare in action)
-while not game.is_terminal(state):
-    player = game.to_move(state)
-    #action = minimax_search(game, state)  
-    action = alpha_beta_search(game, state)  
-    print(f'P{player + 1}\'s action: {action}')
-    assert action is not None
-    state = game.result(state, action)
-    game.print(state)  # Print the current board after each move
+
+# Bitboard variant of the game
+#
+# The board is kept as two 9-bit ints, one per player, where bit row * 3 + col is set if the
+# player has a piece on that square. Checking for a win is then a lookup in a table of every
+# 9-bit pattern, and copying a state copies two ints.
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,  # Rows
+    0b001001001, 0b010010010, 0b100100100,  # Columns
+    0b100010001, 0b001010100,  # Diagonals
+)
+FULL = 0b111111111
+# WINNING[bits] is True if the pieces in bits contain three in a row
+WINNING = [any(bits & mask == mask for mask in WIN_MASKS) for bits in range(FULL + 1)]
+
+BitboardState = tuple[int, tuple[int, int]]  # Tuple of player (whose turn it is), and each player's pieces
+
+
+class BitboardGame:
+    """Drop-in replacement for Game with bitboard states, usable with the same search functions."""
+
+    def initial_state(self) -> BitboardState:
+        return (0, (0, 0))
+
+    def to_move(self, state: BitboardState) -> int:
+        player_index, _ = state
+        return player_index
+
+    def actions(self, state: BitboardState) -> list[Action]:
+        _, (pieces0, pieces1) = state
+        empty = FULL & ~(pieces0 | pieces1)
+        return [(square // 3, square % 3) for square in range(9) if empty >> square & 1]
+
+    def result(self, state: BitboardState, action: Action) -> BitboardState:
+        player, pieces = state
+        row, col = action
+        bit = 1 << (row * 3 + col)
+        if player == 0:
+            return 1, (pieces[0] | bit, pieces[1])
+        return 0, (pieces[0], pieces[1] | bit)
+
+    def key(self, state: BitboardState) -> BitboardState:
+        return state
+
+    def is_winner(self, state: BitboardState, player: int) -> bool:
+        _, pieces = state
+        return WINNING[pieces[player]]
+
+    def is_terminal(self, state: BitboardState) -> bool:
+        player, (pieces0, pieces1) = state
+        return WINNING[pieces0 if player == 1 else pieces1] or pieces0 | pieces1 == FULL
+
+    def utility(self, state: BitboardState, player: int):
+        assert self.is_terminal(state)
+        _, pieces = state
+        if WINNING[pieces[player]]:
+            return 1
+        if WINNING[pieces[1 - player]]:
+            return -1
+        return 0
+
+    def to_board(self, state: BitboardState) -> State:
+        """Converts a state to the list-of-lists representation of Game."""
+        player, pieces = state
+        board = [[None] * 3 for _ in range(3)]
+        for square in range(9):
+            for owner in range(2):
+                if pieces[owner] >> square & 1:
+                    board[square // 3][square % 3] = owner
+        return player, board
+
+    def print(self, state: BitboardState):
+        Game().print(self.to_board(state))
+
+
+class Bitboard:
+    """A mutable bitboard position for searches that make and unmake moves in place instead of
+    creating a new state for every move.
+    """
+
+    def __init__(self, state: BitboardState = (0, (0, 0))):
+        self.player, pieces = state
+        self.pieces = list(pieces)
+
+    def state(self) -> BitboardState:
+        return self.player, (self.pieces[0], self.pieces[1])
+
+    def moves(self) -> list[int]:
+        empty = FULL & ~(self.pieces[0] | self.pieces[1])
+        return [square for square in range(9) if empty >> square & 1]
+
+    def make(self, square: int):
+        self.pieces[self.player] |= 1 << square
+        self.player ^= 1
+
+    def unmake(self, square: int):
+        self.player ^= 1
+        self.pieces[self.player] &= ~(1 << square)
+
+
+def negamax_bitboard(board: Bitboard, alpha: float, beta: float) -> tuple[float, int | None]:
+    """Alpha-beta search on a Bitboard with values from the point of view of the player to move.
+
+    Returns the value and the best square, and leaves the board as it was.
+    """
+    if WINNING[board.pieces[board.player ^ 1]]:
+        return -1, None
+    if board.pieces[0] | board.pieces[1] == FULL:
+        return 0, None
+
+    v = -float('inf')
+    best_square = None
+    for square in board.moves():
+        board.make(square)
+        value = -negamax_bitboard(board, -beta, -alpha)[0]
+        board.unmake(square)
+        if value > v:
+            v = value
+            best_square = square
+        alpha = max(alpha, v)
+        if v >= beta:
+            break
+    return v, best_square
+
+
+def bitboard_search(game: BitboardGame, state: BitboardState) -> Action | None:
+    """Like alpha_beta_search(), searching in place on a Bitboard."""
+    _, square = negamax_bitboard(Bitboard(state), -float('inf'), float('inf'))
+    return None if square is None else (square // 3, square % 3)
+
+
+# Symmetries of the board
+#
+# The 8 rotations and reflections of the board (the dihedral group) map positions to positions
+# with the same value. SYMMETRIES[k][square] is where symmetry k moves a square, and
+# SYMMETRY_TABLES[k][bits] the piece pattern bits transformed by it.
+SYMMETRIES = [
+    tuple(row * 3 + col for row, col in (transform(r, c) for r in range(3) for c in range(3)))
+    for transform in (
+        lambda r, c: (r, c),
+        lambda r, c: (c, 2 - r),  # Rotations
+        lambda r, c: (2 - r, 2 - c),
+        lambda r, c: (2 - c, r),
+        lambda r, c: (r, 2 - c),  # Reflections
+        lambda r, c: (2 - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (2 - c, 2 - r),
+    )
+]
+INVERSE_SYMMETRIES = [
+    tuple(permutation.index(square) for square in range(9)) for permutation in SYMMETRIES
+]
+SYMMETRY_TABLES = [
+    [sum(1 << permutation[square] for square in range(9) if bits >> square & 1) for bits in range(FULL + 1)]
+    for permutation in SYMMETRIES
+]
+
+
+def canonical(board: Bitboard) -> tuple[BitboardState, int]:
+    """Returns the smallest of the 8 symmetric variants of the position, which is the same for
+    all of them, and the index of the symmetry that maps the position to it.
+    """
+    pieces0, pieces1 = board.pieces
+    best, best_symmetry = None, 0
+    for symmetry, table in enumerate(SYMMETRY_TABLES):
+        variant = (table[pieces0], table[pieces1])
+        if best is None or variant < best:
+            best, best_symmetry = variant, symmetry
+    return (board.player, best), best_symmetry
+
+
+class BitboardSearch:
+    """Alpha-beta search on a Bitboard with an optional transposition table.
+
+    With symmetric, positions are stored under their canonical() variant, so the 8 symmetric
+    variants of a position share one entry, and root moves leading to symmetric positions are
+    only searched once. Best moves are stored in the canonical orientation and mapped back.
+    nodes counts the positions searched, to compare configurations.
+    """
+
+    def __init__(self, table: TranspositionTable | None = None, symmetric: bool = False):
+        self.table = table
+        self.symmetric = symmetric
+        self.nodes = 0
+
+    def search(self, game: BitboardGame, state: BitboardState) -> Action | None:
+        board = Bitboard(state)
+        alpha, beta = -float('inf'), float('inf')
+        v = -float('inf')
+        best_square = None
+        seen = set()
+        for square in board.moves():
+            board.make(square)
+            if self.symmetric:
+                key, _ = canonical(board)
+                if key in seen:
+                    board.unmake(square)
+                    continue
+                seen.add(key)
+            value = -self.negamax(board, -beta, -alpha)[0]
+            board.unmake(square)
+            if value > v:
+                v = value
+                best_square = square
+            alpha = max(alpha, v)
+        return None if best_square is None else (best_square // 3, best_square % 3)
+
+    def negamax(self, board: Bitboard, alpha: float, beta: float) -> tuple[float, int | None]:
+        self.nodes += 1
+        if WINNING[board.pieces[board.player ^ 1]]:
+            return -1, None
+        if board.pieces[0] | board.pieces[1] == FULL:
+            return 0, None
+
+        first = None
+        if self.table is not None:
+            if self.symmetric:
+                key, symmetry = canonical(board)
+            else:
+                key, symmetry = board.state(), 0
+            settled, alpha, beta, first = probe(self.table, key, alpha, beta)
+            if first is not None:
+                first = INVERSE_SYMMETRIES[symmetry][first]
+            if settled is not None:
+                return settled[0], first
+            alpha_start, beta_start = alpha, beta
+
+        v = -float('inf')
+        best_square = None
+        moves = board.moves()
+        if first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        for square in moves:
+            board.make(square)
+            value = -self.negamax(board, -beta, -alpha)[0]
+            board.unmake(square)
+            if value > v:
+                v = value
+                best_square = square
+            alpha = max(alpha, v)
+            if v >= beta:
+                break
+        if self.table is not None:
+            self.table.store(key, v, SYMMETRIES[symmetry][best_square], bound_type(v, alpha_start, beta_start))
+        return v, best_square
+
+
+if __name__ == '__main__':
+    # Timing and comparing Minimax and Alpha-beta pruning
+    game = Game()
+    state = game.initial_state()
+
+    # Timing Minimax
+    # start_time_minimax = time.time()
+    # minimax_move = minimax_search(game, state)
+    # minimax_time = time.time() - start_time_minimax
+
+    # # Timing Alpha-beta pruning
+    # start_time_alpha_beta = time.time()
+    # alpha_beta_move = alpha_beta_search(game, state)
+    # alpha_beta_time = time.time() - start_time_alpha_beta
+    # print(f"Minimax move: {minimax_move}, Time taken: {minimax_time:.4f} seconds")
+    # print(f"Alpha-beta move: {alpha_beta_move}, Time taken: {alpha_beta_time:.4f} seconds")
+
+    # Timing the bitboard variant: the same search on bitboard states, and searching in place
+    for label, search, variant in (
+        ('Alpha-beta', alpha_beta_search, game),
+        ('Alpha-beta (bitboard states)', alpha_beta_search, BitboardGame()),
+        ('Alpha-beta (in-place bitboard)', bitboard_search, BitboardGame()),
+    ):
+        start_time = time.perf_counter()
+        move = search(variant, variant.initial_state())
+        print(f"{label} move: {move}, Time taken: {time.perf_counter() - start_time:.4f} seconds")
+
+    # Iterative deepening with a deadline, returning the move of the deepest completed search
+    searcher = IterativeDeepeningSearch(game, line_evaluation)
+    move = searcher.search(state, time_limit=0.2)
+    print(f'Iterative deepening move: {move}, depth {searcher.completed_depth}, {searcher.nodes} nodes')
+
+    # Nodes searched from the empty board without a transposition table, with one, and with one
+    # shared between symmetric positions together with pruning of symmetric root moves
+    for label, searcher in (
+        ('No table', BitboardSearch()),
+        ('Table', BitboardSearch(TranspositionTable())),
+        ('Table with symmetries', BitboardSearch(TranspositionTable(), symmetric=True)),
+    ):
+        searcher.search(BitboardGame(), BitboardGame().initial_state())
+        print(f'{label}: {searcher.nodes} nodes')
+
+    # Play using Alpha-beta pruning (You can change this to minimax_search to compare in action)
+    # The transposition table is kept between moves, so later searches mostly hit states already seen
+    table = TranspositionTable()
+    while not game.is_terminal(state):
+        player = game.to_move(state)
+        #action = minimax_search(game, state, table)  
+        action = alpha_beta_search(game, state, table)  
+        print(f'P{player + 1}\'s action: {action}')
+        assert action is not None
+        state = game.result(state, action)
+        game.print(state)  # Print the current board after each move
+    print(table.report())
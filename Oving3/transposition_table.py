@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# Bound types of a stored value. A search cut off by alpha-beta only knows a bound on the true
+# value: at least the value if it failed high (LOWER), at most the value if it failed low (UPPER).
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+Entry = tuple[float, Any, int]  # Value, best move and bound type
+
+
+class TranspositionTable:
+    """Caches the values of searched states, so a state reached by different move orders is
+    only searched once.
+
+    Holds at most limit entries. When it is full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, limit: int = 1_000_000):
+        self.limit = limit
+        self.entries: OrderedDict[Hashable, Entry] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key: Hashable) -> Entry | None:
+        self.lookups += 1
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key: Hashable, value: float, move: Any, bound: int = EXACT):
+        self.entries[key] = (value, move, bound)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.limit:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def report(self) -> str:
+        return (
+            f'Transposition table: {self.lookups} lookups, {self.hit_rate():.1%} hits, '
+            f'{len(self.entries)} entries, {self.evictions} evictions'
+        )
+
+
+def bound_type(value: float, alpha: float, beta: float) -> int:
+    """Returns the bound type of a value found by an alpha-beta search with the window (alpha, beta)."""
+    if value <= alpha:
+        return UPPER
+    if value >= beta:
+        return LOWER
+    return EXACT